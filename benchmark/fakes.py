@@ -0,0 +1,237 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""In-memory stand-ins for the AWS services used by the Lambda functions"""
+
+import copy
+import re
+import threading
+import time
+from decimal import Decimal
+
+
+def to_attribute_value(value):
+    """Convert a Python value to a DynamoDB attribute value, as found in stream records
+
+    Args:
+        value: A str, bool, number, list or dict
+    """
+
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, list):
+        return {"L": [to_attribute_value(v) for v in value]}
+    if isinstance(value, dict):
+        return {"M": {k: to_attribute_value(v) for k, v in value.items()}}
+    return {"S": str(value)}
+
+
+class FakeTable:
+    """A DynamoDB table kept in memory, optionally emitting NEW_IMAGE stream records"""
+
+    def __init__(self, name, key_names, stream=None):
+        self.name = name
+        self.key_names = key_names
+        self.items = {}
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def _key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def _emit(self, event_name, item):
+        if self.stream is not None:
+            self.stream.append(
+                {
+                    "eventName": event_name,
+                    "dynamodb": {
+                        "NewImage": {k: to_attribute_value(v) for k, v in item.items()},
+                        "SequenceNumber": str(len(self.stream) + 1),
+                    },
+                }
+            )
+
+    def put_item(self, Item, **kwargs):
+        with self.lock:
+            key = self._key(Item)
+            event_name = "MODIFY" if key in self.items else "INSERT"
+            self.items[key] = copy.deepcopy(Item)
+            self._emit(event_name, Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        with self.lock:
+            item = self.items.get(self._key(Key))
+        return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None, ExpressionAttributeNames=None, **kwargs):
+        """Apply "SET a = :v, ..." and "ADD a :v" update expressions"""
+
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self.lock:
+            key = self._key(Key)
+            item = self.items.setdefault(key, dict(Key))
+            for action, body in re.findall(r"(SET|ADD)\s+(.*?)(?=\s+(?:SET|ADD)\s+|$)", UpdateExpression):
+                for clause in body.split(","):
+                    if action == "SET":
+                        name, value = [part.strip() for part in clause.split("=")]
+                        item[names.get(name, name)] = values[value]
+                    else:
+                        name, value = clause.split()
+                        name = names.get(name, name)
+                        item[name] = item.get(name, 0) + values[value]
+            self._emit("MODIFY", item)
+        return {"Attributes": copy.deepcopy(item)}
+
+
+class FakeDynamoDB:
+    """Stand-in for boto3.resource("dynamodb") with the batch operations the Lambdas use"""
+
+    def __init__(self):
+        self.tables = {}
+        self.stream = []
+
+    def create_table(self, name, key_names, stream=False):
+        self.tables[name] = FakeTable(name, key_names, self.stream if stream else None)
+        return self.tables[name]
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            found = []
+            for key in request["Keys"]:
+                item = table.get_item(Key=key).get("Item")
+                if item is not None:
+                    found.append(item)
+            responses[name] = found
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def batch_write_item(self, RequestItems):
+        for name, requests in RequestItems.items():
+            for request in requests:
+                self.tables[name].put_item(Item=request["PutRequest"]["Item"])
+        return {"UnprocessedItems": {}}
+
+    def take_stream_records(self):
+        """Return and clear the stream records emitted so far"""
+
+        records = list(self.stream)
+        self.stream.clear()
+        return records
+
+
+class FakeSSM:
+    """Stand-in for boto3.client("ssm") returning fixed parameter values"""
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+
+    def get_parameter(self, Name, WithDecryption=False):
+        return {"Parameter": {"Name": Name, "Value": self.parameters[Name]}}
+
+
+FAKE_OUTPUT = (
+    "<thinking>- The benchmark article announces a feature\n- It is used for load testing\n</thinking>"
+    "<summary>This is a fixed summary returned by the fake model for benchmarking.</summary>"
+    "<twitter>Fixed summary for benchmarking</twitter>"
+)
+
+
+# The articles of a batched summarization request
+BATCH_ARTICLE = re.compile(r'<article id="(\d+)">')
+
+
+def fake_output(prompt):
+    """Return the fixed answer, once per article for a batched request"""
+
+    numbers = BATCH_ARTICLE.findall(prompt)
+    if not numbers:
+        return FAKE_OUTPUT
+    return "".join(f'<article id="{number}">{FAKE_OUTPUT}</article>' for number in numbers)
+
+
+class FakeResult:
+    def __init__(self, text):
+        self.message = {"role": "assistant", "content": [{"text": text}]}
+
+
+class FakeAgent:
+    """Stand-in for strands.Agent that answers after a configurable latency
+
+    Set FakeAgent.latency (seconds) before use. Streaming responses are split in a few
+    pieces over the same latency.
+    """
+
+    latency = 0.5
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model=None, system_prompt=None, callback_handler=None, **kwargs):
+        self.system_prompt = system_prompt
+
+    @classmethod
+    def _count(cls):
+        with cls._lock:
+            cls.calls += 1
+
+    def __call__(self, prompt):
+        self._count()
+        time.sleep(self.latency)
+        return FakeResult(fake_output(prompt))
+
+
+class FakeEventStream:
+    """Stand-in for the ConverseStream event stream, generating pieces over the latency
+
+    Closing it stops the generation, as closing the HTTP response does for Bedrock. "chunks"
+    counts the pieces generated.
+    """
+
+    def __init__(self, output, latency):
+        self.pieces = [output[i : i + 64] for i in range(0, len(output), 64)]
+        self.latency = latency
+        self.chunks = 0
+        self.closed = False
+        self.usage = {"inputTokens": 0, "outputTokens": len(output) // 4}
+
+    def __iter__(self):
+        yield {"messageStart": {"role": "assistant"}}
+        for piece in self.pieces:
+            if self.closed:
+                return
+            time.sleep(self.latency / len(self.pieces))
+            self.chunks += 1
+            yield {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": piece}}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {"usage": self.usage}}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeModel:
+    """Stand-in for strands.models.BedrockModel and its client, answering like FakeAgent"""
+
+    def __init__(self, **kwargs):
+        self.client = self
+
+    def format_request(self, messages, system_prompt_content=None, **kwargs):
+        return {"messages": messages, "system": system_prompt_content}
+
+    def converse_stream(self, messages, system=None):
+        FakeAgent._count()
+        prompt = messages[-1]["content"][0]["text"]
+        stream = FakeEventStream(fake_output(prompt), FakeAgent.latency)
+        stream.usage["inputTokens"] = (len(prompt) + sum(len(block["text"]) for block in system or [])) // 4
+        return {"stream": stream}
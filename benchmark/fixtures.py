@@ -0,0 +1,110 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Feed and article fixtures, generated at any size or replayed from recorded files"""
+
+import datetime
+import email.utils
+import html
+
+ITEM_TEMPLATE = """<item>
+<title>{title}</title>
+<link>{link}</link>
+<guid isPermaLink="false">{guid}</guid>
+<pubDate>{pubdate}</pubDate>
+<category>general:products/amazon-bedrock</category>
+<description><![CDATA[<p>{description}</p>]]></description>
+<content:encoded><![CDATA[<p>{description}</p><p>{description}</p>]]></content:encoded>
+</item>
+"""
+
+DESCRIPTION = (
+    "Amazon Bedrock now supports a new capability that lets customers build generative AI "
+    "applications with improved latency and lower cost. The feature is available in all "
+    "commercial regions where the service is offered."
+)
+
+ARTICLE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<script>{script}</script><style>{style}</style></head>
+<body>
+<header><nav>{nav}</nav></header>
+<main>
+<h1>{title}</h1>
+{paragraphs}
+</main>
+<aside>{nav}</aside>
+<footer>{nav}</footer>
+<script>{script}</script>
+</body></html>
+"""
+
+
+def generate_feed(size, base_url, now=None):
+    """Build an RSS 2.0 document whose entries all fall within the crawler's 7-day window
+
+    Args:
+        size (int): The number of entries
+        base_url (str): The URL prefix of the article links
+        now (datetime.datetime): The publication time of the newest entry
+
+    Returns:
+        bytes: The feed document, newest entry first
+    """
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    spacing = datetime.timedelta(days=6) / max(size, 1)
+    items = []
+    for i in range(size):
+        published = now - spacing * i
+        items.append(
+            ITEM_TEMPLATE.format(
+                title=html.escape(f"Benchmark announcement {i}"),
+                link=f"{base_url}/article/{i}",
+                guid=f"benchmark-{i}",
+                pubdate=email.utils.format_datetime(published),
+                description=DESCRIPTION,
+            )
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">\n'
+        "<channel><title>Benchmark feed</title><link>https://example.com/</link>\n"
+        f"<lastBuildDate>{email.utils.format_datetime(now)}</lastBuildDate>\n"
+        + "".join(items)
+        + "</channel></rss>\n"
+    ).encode("utf-8")
+
+
+def generate_article(index, paragraphs=40):
+    """Build an article page with boilerplate around a <main> region
+
+    Args:
+        index (int): Makes the text unique, so that summaries are not served from the cache
+        paragraphs (int): The number of paragraphs in <main>
+
+    Returns:
+        bytes: The HTML document
+    """
+
+    body = "\n".join(
+        f"<p>Paragraph {n} of article {index}. {DESCRIPTION}</p>" for n in range(paragraphs)
+    )
+    return ARTICLE_TEMPLATE.format(
+        title=f"Benchmark announcement {index}",
+        script="var analytics = {};" * 200,
+        style="body { margin: 0; }" * 200,
+        nav=" ".join(f'<a href="/section/{n}">Section {n}</a>' for n in range(50)),
+        paragraphs=body,
+    ).encode("utf-8")
+
+
+def load_fixture(path):
+    """Read a recorded feed or article
+
+    Args:
+        path (str): The path of the recorded file
+    """
+
+    with open(path, "rb") as f:
+        return f.read()
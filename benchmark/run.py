@@ -0,0 +1,474 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Offline end-to-end benchmark of the rss-crawler and notify-to-app Lambda functions
+
+Feeds and articles are served from a local HTTP server, DynamoDB and Parameter Store are
+replaced by in-memory stand-ins, Bedrock by a fake agent with a configurable latency, and
+Slack by a local webhook sink. Each scenario runs in its own process, so that imports and
+peak memory of one scenario do not affect the next.
+
+Usage:
+    python benchmark/run.py
+    python benchmark/run.py --feed-sizes 10,1000 --backlogs 1,100 --bedrock-latency 1.0
+"""
+
+import argparse
+import http.server
+import importlib
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+LAMBDA_DIRS = {
+    "crawler": os.path.join(ROOT_DIR, "lambda", "rss-crawler"),
+    "notifier": os.path.join(ROOT_DIR, "lambda", "notify-to-app"),
+}
+# Deployed as a Lambda layer next to both functions
+SHARED_DIR = os.path.join(ROOT_DIR, "lambda", "shared")
+
+sys.path.insert(0, BENCHMARK_DIR)
+
+import fakes  # noqa: E402
+import fixtures  # noqa: E402
+
+# Records per invocation, as configured on the DynamoDB event source
+STREAM_BATCH_SIZE = 10
+# Metrics that report a level rather than a count: the last value is shown, not the total
+GAUGES = ("ModelConcurrencyLimit", "PollInterval", "InitDuration")
+
+
+def percentile(values, p):
+    """Return the p-th percentile of a list of values (nearest rank)"""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class MetricsFile:
+    """Collect the EMF records the Lambda functions write, and summarize them"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="metrics-", suffix=".jsonl")
+        os.close(fd)
+        os.environ["METRICS_FILE"] = self.path
+
+    def records(self):
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def summary(self):
+        """Return the p50/p95 of StageDuration by stage, the last value of the GAUGES, and the
+        totals of the other metrics"""
+
+        samples = {}
+        totals = {}
+        for record in self.records():
+            for definition in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+                name = definition["Name"]
+                if name == "StageDuration":
+                    samples.setdefault(record["Stage"], []).extend(record[name])
+                elif name in GAUGES:
+                    totals[name] = record[name][-1]
+                else:
+                    totals[name] = totals.get(name, 0) + sum(record[name])
+        os.remove(self.path)
+        stages = {
+            stage: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+            }
+            for stage, values in samples.items()
+        }
+        return stages, totals
+
+
+class FixtureServer:
+    """Serve the feed, the articles and a webhook sink on localhost"""
+
+    def __init__(self, feed=b"", article=None):
+        self.feed = feed
+        self.article = article
+        self.posts = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path.startswith("/feed"):
+                    body, content_type = server.feed, "application/rss+xml"
+                elif self.path.startswith("/article/"):
+                    index = int(self.path.rsplit("/", 1)[-1])
+                    body, content_type = server.article_body(index), "text/html; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stops reading once it has what it needs
+                    pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.posts += 1
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def article_body(self, index):
+        if self.article is None:
+            return fixtures.generate_article(index)
+        # Make every copy of a recorded article unique, so that summaries are not cached
+        return self.article.replace(b"</main>", f"<p>Copy {index}</p></main>".encode(), 1)
+
+
+class FakeContext:
+    """Lambda context with plenty of remaining time"""
+
+    function_name = "benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+def install_fakes(dynamo, ssm):
+    """Route boto3 resources and clients to the in-memory stand-ins"""
+
+    import boto3
+
+    boto3.resource = lambda service, *args, **kwargs: dynamo
+    boto3.client = lambda service, *args, **kwargs: ssm
+
+
+def load_handler(name):
+    """Import the index module of a Lambda function from its directory"""
+
+    sys.path.insert(0, SHARED_DIR)
+    sys.path.insert(0, LAMBDA_DIRS[name])
+    return importlib.import_module("index")
+
+
+def crawler_environment():
+    """Return the environment variables of the crawler"""
+
+    return {
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "DDB_TABLE_NAME": "history",
+        "CRAWL_STATE_TABLE_NAME": "crawl-state",
+    }
+
+
+def notifier_environment():
+    """Return the environment variables of the notifier, with the summarizers of cdk.json"""
+
+    with open(os.path.join(ROOT_DIR, "cdk.json"), encoding="utf-8") as f:
+        context = json.load(f)["context"]
+    notifiers = {
+        "Benchmark": {
+            "destination": "slack",
+            "summarizerName": "AwsSolutionsArchitectEnglish",
+            "webhookUrlParameterName": "/Benchmark/URL",
+            "rssUrl": {},
+        }
+    }
+    return {
+        "MODEL_ID": "fake.model",
+        "MODEL_REGION": "us-east-1",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "NOTIFIERS": json.dumps(notifiers),
+        "SUMMARIZERS": json.dumps(context["summarizers"]),
+        "SUMMARY_CACHE_TABLE_NAME": "summary-cache",
+        "OUTBOX_TABLE_NAME": "outbox",
+        # Generated articles differ in a few words only, and would be skipped as the same story
+        "NEAR_DUPLICATE_DETECTION": "false",
+        # The local sink has no rate limit; pass --slack-rate to emulate Slack's
+        "SLACK_RATE_PER_SECOND": os.environ.get("SLACK_RATE_PER_SECOND", "1000"),
+        "SLACK_BURST": os.environ.get("SLACK_BURST", "1000"),
+    }
+
+
+def bench_cold_start(name):
+    """Import the handler module of a function in this fresh interpreter, as a cold start does
+
+    Unlike the other scenarios, boto3 is not replaced: creating clients and resources is part
+    of the init phase, and does not call AWS.
+    """
+
+    os.environ.update(crawler_environment() if name == "crawler" else notifier_environment())
+    metrics_file = MetricsFile()
+    started = time.perf_counter()
+    load_handler(name)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    import metrics
+    import startup
+
+    metrics.flush()
+    _, totals = metrics_file.summary()
+    slowest = sorted(startup.imports.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "scenario": "coldstart",
+        "function": name,
+        "import_ms": round(elapsed, 2),
+        "init_duration_ms": totals.get("InitDuration", 0),
+        "imports": {module: round(ms, 2) for module, ms in slowest[:8]},
+        "modules_loaded": len(sys.modules),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def bench_crawler(size, repeat, feed_fixture):
+    """Crawl one feed of `size` entries into an empty table, `repeat` times"""
+
+    server = FixtureServer()
+    server.feed = (
+        fixtures.load_fixture(feed_fixture)
+        if feed_fixture
+        else fixtures.generate_feed(size, server.base_url)
+    )
+    os.environ.update(crawler_environment())
+    dynamo = fakes.FakeDynamoDB()
+    tables = [
+        dynamo.create_table("history", ["url", "notifier_name"], stream=True),
+        dynamo.create_table("crawl-state", ["feed_url", "notifier_name"]),
+    ]
+    install_fakes(dynamo, fakes.FakeSSM({}))
+    metrics_file = MetricsFile()
+    index = load_handler("crawler")
+
+    event = {
+        "notifierName": "Benchmark",
+        "notifier": {"rssUrl": {"Benchmark feed": f"{server.base_url}/feed.xml"}},
+    }
+    durations = []
+    inserted = 0
+    tracemalloc.start()
+    for _ in range(repeat):
+        for table in tables:
+            table.clear()
+        started = time.perf_counter()
+        result = index.handler(event, FakeContext())
+        durations.append(time.perf_counter() - started)
+        inserted += result["inserted"]
+        dynamo.take_stream_records()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(durations)
+    stages, totals = metrics_file.summary()
+    return {
+        "scenario": "crawler",
+        "size": size,
+        "runs": repeat,
+        "items_per_second": round(inserted / total, 1) if total else 0.0,
+        "handler_p50_ms": round(percentile([d * 1000 for d in durations], 50), 2),
+        "stages": stages,
+        "metrics": totals,
+        "peak_traced_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def bench_notifier(backlog, latency, article_fixture):
+    """Drain a stream backlog of `backlog` new articles through the notifier"""
+
+    server = FixtureServer(
+        article=fixtures.load_fixture(article_fixture) if article_fixture else None
+    )
+    os.environ.update(notifier_environment())
+    dynamo = fakes.FakeDynamoDB()
+    history = dynamo.create_table("history", ["url", "notifier_name"], stream=True)
+    dynamo.create_table("summary-cache", ["cache_key"])
+    dynamo.create_table("outbox", ["outbox_key"])
+    install_fakes(dynamo, fakes.FakeSSM({"/Benchmark/URL": f"{server.base_url}/hook"}))
+    metrics_file = MetricsFile()
+    index = load_handler("notifier")
+
+    fakes.FakeAgent.latency = latency
+    index.create_agent = fakes.FakeAgent
+    index.get_bedrock_model = fakes.FakeModel
+
+    for i in range(backlog):
+        history.put_item(
+            Item={
+                "url": f"{server.base_url}/article/{i}",
+                "notifier_name": "Benchmark",
+                "title": f"Benchmark announcement {i}",
+                "category": "Benchmark feed",
+                "pubtime": "2026-01-01T00:00:00",
+            }
+        )
+    records = dynamo.take_stream_records()
+
+    failures = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    batch_durations = []
+    for i in range(0, len(records), STREAM_BATCH_SIZE):
+        batch_started = time.perf_counter()
+        response = index.handler({"Records": records[i : i + STREAM_BATCH_SIZE]}, FakeContext())
+        batch_durations.append((time.perf_counter() - batch_started) * 1000)
+        failures += len(response["batchItemFailures"])
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stages, totals = metrics_file.summary()
+
+    return {
+        "scenario": "notifier",
+        "size": backlog,
+        "bedrock_latency_s": latency,
+        "records_per_second": round(server.posts / total, 2) if total else 0.0,
+        "posted": server.posts,
+        "model_calls": fakes.FakeAgent.calls,
+        "failed_batches": failures,
+        "handler_p50_ms": round(percentile(batch_durations, 50), 2),
+        "stages": stages,
+        "metrics": totals,
+        "peak_traced_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_subprocess(args, scenario, size):
+    """Run one scenario in a fresh interpreter and return its result"""
+
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--scenario", scenario,
+        "--size", str(size),
+        "--function", args.function or "",
+        "--repeat", str(args.repeat),
+        "--bedrock-latency", str(args.bedrock_latency),
+    ]
+    if args.feed_fixture:
+        command += ["--feed-fixture", args.feed_fixture]
+    if args.article_fixture:
+        command += ["--article-fixture", args.article_fixture]
+    env = dict(os.environ)
+    if args.slack_rate:
+        env["SLACK_RATE_PER_SECOND"] = str(args.slack_rate)
+        env["SLACK_BURST"] = "1"
+    if args.summary_batch_items > 1:
+        env["SUMMARY_BATCH_ITEMS"] = str(args.summary_batch_items)
+    output = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+    # The Lambda functions print their own logs; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(results):
+    """Print the results as a table"""
+
+    for result in results:
+        if result["scenario"] == "coldstart":
+            print(
+                f"coldstart {result['function']:<8} init_p50={result['init_p50_ms']}ms "
+                f"init_max={result['init_max_ms']}ms modules={result['modules_loaded']} "
+                f"rss={result['max_rss_mb']}MB"
+            )
+            print("    " + " ".join(f"{module}={ms}ms" for module, ms in result["imports"].items()))
+            continue
+        throughput = result.get("items_per_second", result.get("records_per_second"))
+        print(
+            f"{result['scenario']:<9} size={result['size']:<6} "
+            f"throughput={throughput:<9}/s handler_p50={result['handler_p50_ms']}ms "
+            f"peak={result['peak_traced_mb']}MB rss={result['max_rss_mb']}MB"
+        )
+        for stage, stats in result["stages"].items():
+            print(
+                f"    {stage:<18} n={stats['count']:<6} "
+                f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms"
+            )
+        if result["metrics"]:
+            print("    " + " ".join(f"{name}={value}" for name, value in sorted(result["metrics"].items())))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--feed-sizes", default="10,100,1000,10000", help="Entries per feed")
+    parser.add_argument("--backlogs", default="1,10,100,1000", help="Stream records to drain")
+    parser.add_argument("--repeat", type=int, default=5, help="Crawler runs per feed size")
+    parser.add_argument("--bedrock-latency", type=float, default=0.5, help="Fake model latency in seconds")
+    parser.add_argument("--slack-rate", type=float, default=0, help="Emulated Slack messages per second (0: unlimited)")
+    parser.add_argument("--summary-batch-items", type=int, default=1, help="Articles summarized per model call")
+    parser.add_argument("--feed-fixture", help="Replay a recorded feed instead of a generated one")
+    parser.add_argument("--article-fixture", help="Replay a recorded article page instead of a generated one")
+    parser.add_argument("--cold-starts", type=int, default=5, help="Cold starts measured per function (0: skip)")
+    parser.add_argument("--max-init-ms", type=float, default=0, help="Exit with an error if a median cold start exceeds this")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--scenario", choices=[*LAMBDA_DIRS, "coldstart"], help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--function", choices=[*LAMBDA_DIRS, ""], help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.scenario == "crawler":
+        print(json.dumps(bench_crawler(args.size, args.repeat, args.feed_fixture)))
+        return
+    if args.scenario == "notifier":
+        print(json.dumps(bench_notifier(args.size, args.bedrock_latency, args.article_fixture)))
+        return
+    if args.scenario == "coldstart":
+        print(json.dumps(bench_cold_start(args.function)))
+        return
+
+    results = []
+    for name in LAMBDA_DIRS if args.cold_starts else []:
+        args.function = name
+        runs = [run_subprocess(args, "coldstart", 0) for _ in range(args.cold_starts)]
+        args.function = None
+        result = runs[-1]
+        durations = [run["init_duration_ms"] for run in runs]
+        result["init_p50_ms"] = round(percentile(durations, 50), 2)
+        result["init_max_ms"] = round(max(durations), 2)
+        results.append(result)
+    for size in [int(s) for s in args.feed_sizes.split(",") if s]:
+        results.append(run_subprocess(args, "crawler", size))
+    for backlog in [int(s) for s in args.backlogs.split(",") if s]:
+        results.append(run_subprocess(args, "notifier", backlog))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    slow = [
+        result["function"]
+        for result in results
+        if result["scenario"] == "coldstart" and args.max_init_ms and result["init_p50_ms"] > args.max_init_ms
+    ]
+    if slow:
+        sys.exit(f"Cold start exceeds {args.max_init_ms}ms: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Clients and sessions cached across warm invocations of the Lambda container"""
+
+import contextlib
+import datetime
+import os
+import threading
+import time
+import urllib.parse
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+import log
+
+# Assumed-role credentials are refreshed this long before they expire
+CREDENTIALS_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+# Webhook URLs are read from Parameter Store at most once per this many seconds
+WEBHOOK_CACHE_TTL_SECONDS = int(os.environ.get("WEBHOOK_CACHE_TTL_SECONDS", "300"))
+# Attempts per Bedrock request, including the first. Throttling is mostly handled by the
+# adaptive limiter and the circuit breaker (see throttling.py), so that a throttled article
+# does not spend the invocation in retries while the others wait.
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", "3"))
+
+_lock = threading.Lock()
+_bedrock_sessions = {}
+_webhook_urls = {}
+# Host -> idle cloudscraper sessions. A session changes its state (cookies, headers, challenge
+# retries) while it solves a challenge, so it is lent to one thread at a time.
+_http_sessions = {}
+
+ssm = boto3.client("ssm")
+
+
+def _get_bedrock_session_entry(
+    assumed_role: Optional[str] = None,
+    region: Optional[str] = None,
+):
+    """Return the cache entry of a boto3 Session for Amazon Bedrock, reusing it while its credentials are valid
+
+    Models created from the session are stored in the same entry, so they are discarded
+    together with the session when its credentials are refreshed.
+
+    Args:
+        assumed_role (Optional[str]): Optional ARN of an AWS IAM role to assume for calling the Bedrock service. If not
+            specified, the current active credentials will be used.
+        region (Optional[str]): Optional name of the AWS Region in which the service should be called (e.g. "us-east-1").
+            If not specified, AWS_REGION or AWS_DEFAULT_REGION environment variable will be used.
+    """
+
+    if region is None:
+        target_region = os.environ.get(
+            "AWS_REGION", os.environ.get("AWS_DEFAULT_REGION")
+        )
+    else:
+        target_region = region
+
+    key = (assumed_role, target_region)
+    with _lock:
+        cached = _bedrock_sessions.get(key)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if cached and (cached["expiration"] is None or now < cached["expiration"]):
+            return cached
+
+        session_kwargs = {"region_name": target_region}
+
+        profile_name = os.environ.get("AWS_PROFILE")
+        if profile_name:
+            session_kwargs["profile_name"] = profile_name
+        log.info("Create new session", region=target_region, profile=profile_name, role=assumed_role)
+
+        session = boto3.Session(**session_kwargs)
+        expiration = None
+
+        if assumed_role:
+            sts = session.client("sts")
+            response = sts.assume_role(
+                RoleArn=str(assumed_role), RoleSessionName="langchain-llm-1"
+            )
+            credentials = response["Credentials"]
+            session = boto3.Session(
+                aws_access_key_id=credentials["AccessKeyId"],
+                aws_secret_access_key=credentials["SecretAccessKey"],
+                aws_session_token=credentials["SessionToken"],
+                region_name=target_region,
+            )
+            expiration = credentials["Expiration"] - CREDENTIALS_REFRESH_MARGIN
+
+        entry = {"session": session, "expiration": expiration, "models": {}}
+        _bedrock_sessions[key] = entry
+        return entry
+
+
+def get_retry_config(region):
+    """Return the botocore configuration used for Bedrock clients
+
+    Args:
+        region (str): The name of the AWS Region
+    """
+
+    return Config(
+        region_name=region,
+        retries={
+            "max_attempts": BEDROCK_MAX_ATTEMPTS,
+            "mode": "standard",
+        },
+    )
+
+
+def get_bedrock_model(
+    model_id: str,
+    region: str,
+    params: dict,
+    additional_request_fields: dict,
+    assumed_role: Optional[str] = None,
+    cache_prompt: Optional[str] = None,
+    streaming: bool = False,
+):
+    """Return a Strands BedrockModel, reusing it while its session is valid
+
+    The model is stateless and shared between threads. Create a new Agent per request,
+    because an Agent keeps the conversation history.
+
+    Args:
+        model_id (str): The Bedrock model ID
+        region (str): The name of the AWS Region to call Bedrock in
+        params (dict): The inference parameters
+        additional_request_fields (dict): Model specific request fields
+        assumed_role (Optional[str]): Optional ARN of an AWS IAM role to assume for calling Bedrock
+        cache_prompt (Optional[str]): Optional cache point type (e.g. "default") added after the system prompt
+        streaming (bool): Use the ConverseStream API instead of Converse
+    """
+
+    # Imported on first use: the SDK takes most of the cold start otherwise
+    from strands.models import BedrockModel
+
+    entry = _get_bedrock_session_entry(assumed_role, region)
+    key = (model_id, cache_prompt, streaming)
+    with _lock:
+        model = entry["models"].get(key)
+        if model is None:
+            session = entry["session"]
+            model = BedrockModel(
+                params=params,
+                additional_request_fields=additional_request_fields,
+                model_id=model_id,
+                boto_session=session,
+                boto_client_config=get_retry_config(session.region_name),
+                streaming=streaming,
+                cache_prompt=cache_prompt,
+            )
+            entry["models"][key] = model
+        return model
+
+
+def get_webhook_url(parameter_name):
+    """Return a webhook URL stored in Parameter Store, cached for WEBHOOK_CACHE_TTL_SECONDS
+
+    Args:
+        parameter_name (str): The name of the SecureString parameter
+    """
+
+    with _lock:
+        cached = _webhook_urls.get(parameter_name)
+        if cached and time.monotonic() < cached["expires_at"]:
+            return cached["value"]
+
+    ssm_response = ssm.get_parameter(Name=parameter_name, WithDecryption=True)
+    value = ssm_response["Parameter"]["Value"]
+    with _lock:
+        _webhook_urls[parameter_name] = {
+            "value": value,
+            "expires_at": time.monotonic() + WEBHOOK_CACHE_TTL_SECONDS,
+        }
+    return value
+
+
+@contextlib.contextmanager
+def http_session(url):
+    """Lend an HTTP session for the host of a URL for the duration of the block
+
+    Idle cloudscraper sessions are kept per host across warm invocations, so that connections
+    (and TLS handshakes) are reused for articles on the same site. A session is only used by
+    one thread at a time; a new one is created when all sessions of the host are in use.
+
+    Args:
+        url (str): The URL to be requested
+    """
+
+    import cloudscraper
+
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    with _lock:
+        idle = _http_sessions.setdefault(host, [])
+        session = idle.pop() if idle else None
+    if session is None:
+        session = cloudscraper.create_scraper()
+    try:
+        yield session
+    finally:
+        with _lock:
+            _http_sessions[host].append(session)
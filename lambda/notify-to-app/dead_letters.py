@@ -0,0 +1,101 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Stream batches that ran out of retry attempts, kept in an SQS queue to be replayed
+
+When a record still fails after the retry attempts of the event source mapping (e.g., while
+the model is unavailable), Lambda sends the position of the batch in the stream to the
+on-failure queue. The records themselves stay in the stream for 24 hours, so a replay reads
+them back from there.
+"""
+
+import json
+import os
+
+import boto3
+from botocore.exceptions import ClientError
+
+import log
+
+DEAD_LETTER_QUEUE_URL = os.environ.get("DEAD_LETTER_QUEUE_URL")
+# SQS returns at most 10 messages per request
+RECEIVE_BATCH_SIZE = 10
+# Records per GetRecords request
+STREAM_READ_LIMIT = 100
+
+sqs = boto3.client("sqs") if DEAD_LETTER_QUEUE_URL else None
+streams = boto3.client("dynamodbstreams") if DEAD_LETTER_QUEUE_URL else None
+
+
+class ExpiredBatchError(Exception):
+    """The records of a batch are no longer in the stream"""
+
+
+def receive():
+    """Receive the failed batches waiting in the queue
+
+    Returns:
+        list: The SQS messages, each with "ReceiptHandle" and "batch" (the DDBStreamBatchInfo)
+    """
+
+    if sqs is None:
+        return []
+    response = sqs.receive_message(
+        QueueUrl=DEAD_LETTER_QUEUE_URL,
+        MaxNumberOfMessages=RECEIVE_BATCH_SIZE,
+    )
+    messages = response.get("Messages", [])
+    for message in messages:
+        message["batch"] = json.loads(message["Body"])["DDBStreamBatchInfo"]
+    return messages
+
+
+def delete(message):
+    """Remove a replayed (or expired) batch from the queue
+
+    Args:
+        message (dict): The message, as returned by receive
+    """
+
+    sqs.delete_message(QueueUrl=DEAD_LETTER_QUEUE_URL, ReceiptHandle=message["ReceiptHandle"])
+
+
+def read_records(batch):
+    """Read the records of a failed batch back from the stream
+
+    Args:
+        batch (dict): The DDBStreamBatchInfo of the message: "streamArn", "shardId",
+            "startSequenceNumber" and "endSequenceNumber"
+
+    Returns:
+        list: The stream records, in the format of the Lambda event
+
+    Raises:
+        ExpiredBatchError: The stream no longer has the records (after 24 hours)
+    """
+
+    end = int(batch["endSequenceNumber"])
+    try:
+        iterator = streams.get_shard_iterator(
+            StreamArn=batch["streamArn"],
+            ShardId=batch["shardId"],
+            ShardIteratorType="AT_SEQUENCE_NUMBER",
+            SequenceNumber=batch["startSequenceNumber"],
+        )["ShardIterator"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("TrimmedDataAccessException", "ResourceNotFoundException"):
+            raise ExpiredBatchError(str(e)) from e
+        raise
+
+    records = []
+    while iterator:
+        response = streams.get_records(ShardIterator=iterator, Limit=STREAM_READ_LIMIT)
+        for record in response["Records"]:
+            if int(record["dynamodb"]["SequenceNumber"]) > end:
+                return records
+            records.append(record)
+        if not response["Records"] or (records and int(records[-1]["dynamodb"]["SequenceNumber"]) == end):
+            break
+        iterator = response.get("NextShardIterator")
+    log.debug("Batch read from the stream", shard=batch["shardId"], records=len(records))
+    return records
@@ -0,0 +1,204 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Article text extraction from a streamed, size-capped HTML response"""
+
+import codecs
+import os
+import re
+import time
+
+from lxml import etree
+
+import log
+
+# Stop reading the page after this many bytes
+MAX_ARTICLE_BYTES = int(os.environ.get("MAX_ARTICLE_BYTES", str(2 * 1024 * 1024)))
+CHUNK_SIZE = 32 * 1024
+
+# Content regions in order of preference, used when the page has no <main>
+CONTENT_XPATHS = (
+    ("main", "//main"),
+    ("article", "//article"),
+    ("role-main", "//*[@role='main']"),
+    ("content-id", "//*[@id='content' or @id='main-content' or @id='article-body']"),
+    (
+        "content-class",
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' entry-content ')"
+        " or contains(concat(' ', normalize-space(@class), ' '), ' post-content ')"
+        " or contains(concat(' ', normalize-space(@class), ' '), ' article-body ')]",
+    ),
+)
+
+# Elements that never carry article text
+BOILERPLATE_TAGS = (
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "iframe",
+    "form",
+    "button",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+)
+
+# Regions shorter than this are treated as not found
+MIN_CONTENT_CHARS = 200
+
+WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+BLANK_LINES = re.compile(r"\n\s*\n+")
+CHARSET = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+def header_encoding(content_type):
+    """Return the charset declared in a Content-Type header
+
+    requests falls back to ISO-8859-1 for text/html without a charset, which would override
+    the <meta charset> of the page, so the header is read here instead of response.encoding.
+
+    Args:
+        content_type (str): The Content-Type header, if any
+
+    Returns:
+        str: The encoding name, or None if the header declares no known charset
+    """
+
+    match = CHARSET.search(content_type or "")
+    if not match:
+        return None
+    try:
+        return codecs.lookup(match.group(1)).name
+    except LookupError:
+        return None
+
+
+def parse_stream(chunks, timing, encoding=None):
+    """Parse HTML incrementally, stopping once </main> is closed or the size cap is reached
+
+    Args:
+        chunks: An iterable of bytes, e.g., response.iter_content()
+        timing (dict): Receives the milliseconds spent in "download" and "parse", and the "bytes" read
+        encoding (str): The charset of the HTTP header, if any. Without it, the parser uses
+            the <meta charset> of the page.
+
+    Returns:
+        lxml.etree._Element: The root of the (possibly partial) document
+    """
+
+    parser = etree.HTMLPullParser(events=("end",), tag="main", encoding=encoding)
+    received = 0
+    download = 0.0
+    parse = 0.0
+    started = time.perf_counter()
+    for chunk in chunks:
+        fed = time.perf_counter()
+        download += fed - started
+        parser.feed(chunk)
+        received += len(chunk)
+        done = any(True for _ in parser.read_events())
+        started = time.perf_counter()
+        parse += started - fed
+        if done:
+            break
+        if received >= MAX_ARTICLE_BYTES:
+            log.warning("Article exceeds MAX_ARTICLE_BYTES, truncated", max_bytes=MAX_ARTICLE_BYTES)
+            break
+
+    fed = time.perf_counter()
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        # Nothing that looks like HTML was received
+        root = None
+    parse += time.perf_counter() - fed
+    timing["download"] = round(download * 1000, 1)
+    timing["parse"] = round(parse * 1000, 1)
+    timing["bytes"] = received
+    return root
+
+
+def densest_block(root):
+    """Find the block whose direct <p> children hold the most text
+
+    Args:
+        root (lxml.etree._Element): The document root
+    """
+
+    best, best_score = None, 0
+    for block in root.iter("div", "section", "td"):
+        score = sum(len("".join(p.itertext())) for p in block.iterchildren("p"))
+        if score > best_score:
+            best, best_score = block, score
+    return best
+
+
+def element_text(element):
+    """Return the visible text of an element without boilerplate
+
+    Args:
+        element (lxml.etree._Element): The content region
+    """
+
+    etree.strip_elements(element, *BOILERPLATE_TAGS, etree.Comment, with_tail=False)
+    text = WHITESPACE.sub(" ", "".join(element.itertext()))
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+
+def select_content(root):
+    """Pick the article region, falling back through several content heuristics
+
+    Args:
+        root (lxml.etree._Element): The document root
+
+    Returns:
+        tuple: The text of the region and the name of the heuristic that found it, or (None, None)
+    """
+
+    if root is None:
+        return None, None
+    for name, xpath in CONTENT_XPATHS:
+        for element in root.xpath(xpath):
+            text = element_text(element)
+            if len(text) >= MIN_CONTENT_CHARS:
+                return text, name
+    block = densest_block(root)
+    if block is not None:
+        text = element_text(block)
+        if len(text) >= MIN_CONTENT_CHARS:
+            return text, "densest-block"
+    body = root.find("body")
+    if body is not None:
+        text = element_text(body)
+        if text:
+            return text, "body"
+    return None, None
+
+
+def extract_content(session, url, headers, timeout):
+    """Download an article and extract its main text
+
+    Args:
+        session: The requests-compatible session used for the download
+        url (str): The URL of the article
+        headers (dict): The request headers
+        timeout (float): The connect/read timeout in seconds
+
+    Returns:
+        str: The article text, or None if no content could be found
+    """
+
+    timing = {}
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        encoding = header_encoding(response.headers.get("Content-Type"))
+        root = parse_stream(response.iter_content(CHUNK_SIZE), timing, encoding)
+
+    started = time.perf_counter()
+    text, heuristic = select_content(root)
+    timing["select"] = round((time.perf_counter() - started) * 1000, 1)
+    log.info("Article extracted", url=url, heuristic=heuristic, **timing)
+    return text
@@ -0,0 +1,212 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Glossaries of required translations, matched against articles and model outputs
+
+A glossary is a JSON file in the glossaries directory, mapping categories (e.g., "names") to
+entries {"term", "translation", "aliases" (optional)}. Instead of sending the whole glossary
+with every request, the article is scanned once for all terms and aliases with an Aho-Corasick
+automaton, and only the entries found are sent. The same automaton checks that the output renders each of
+those terms with its translation.
+"""
+
+import collections
+import hashlib
+import json
+import os
+
+GLOSSARIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "glossaries")
+
+# Kinds of the patterns of a glossary
+TERM = "term"
+TRANSLATION = "translation"
+
+
+class Automaton:
+    """Aho-Corasick automaton finding every occurrence of many patterns in one pass over a text
+
+    Args:
+        patterns (list): The strings to find
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        # Per state: transitions, failure link, and the patterns ending there
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].append(index)
+
+        # Breadth-first, so that the failure link of a state is set before its children's
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def search(self, text):
+        """Yield the occurrences of the patterns in a text
+
+        Args:
+            text (str): The text
+
+        Yields:
+            tuple: (start offset, pattern index), in order of the end offset
+        """
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield end - len(self.patterns[index]), index
+
+
+def is_word_boundary(text, start, end):
+    """Return whether a match is not part of a longer Latin word, e.g., "Toe" in "Toes"
+
+    Args:
+        text (str): The text
+        start (int): The start offset of the match
+        end (int): The end offset of the match
+    """
+
+    def joins(char):
+        # Japanese and Chinese text has no spaces around Latin words
+        return char.isalnum() and char < "\u3000"
+
+    return not (start > 0 and joins(text[start - 1])) and not (end < len(text) and joins(text[end]))
+
+
+class Glossary:
+    """The entries of a glossary file and the automaton of their terms and translations
+
+    Terms match case-insensitively and as whole words.
+
+    Args:
+        categories (dict): Mapping of category name to its list of entries
+    """
+
+    def __init__(self, categories):
+        self.entries = []
+        # (entry index, TERM or TRANSLATION) of each pattern of the automaton
+        self._owners = []
+        patterns = []
+        for category, entries in categories.items():
+            for entry in entries:
+                index = len(self.entries)
+                self.entries.append({**entry, "category": category})
+                for term in [entry["term"], *entry.get("aliases", [])]:
+                    patterns.append(term.lower())
+                    self._owners.append((index, TERM))
+                patterns.append(entry["translation"].lower())
+                self._owners.append((index, TRANSLATION))
+        self._automaton = Automaton(patterns)
+        # Changes whenever an entry changes, so cached summaries are not reused
+        self.version = hashlib.sha256(
+            json.dumps(categories, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def scan(self, text):
+        """Find the entries whose term, and those whose translation, appear in a text
+
+        Args:
+            text (str): The text
+
+        Returns:
+            tuple: (set of entry indexes with a term found, set with a translation found)
+        """
+
+        lowered = text.lower()
+        found = {TERM: set(), TRANSLATION: set()}
+        for start, index in self._automaton.search(lowered):
+            entry, kind = self._owners[index]
+            end = start + len(self._automaton.patterns[index])
+            if kind == TERM and not is_word_boundary(lowered, start, end):
+                continue
+            found[kind].add(entry)
+        return found[TERM], found[TRANSLATION]
+
+    def match(self, text):
+        """Return the entries whose term appears in a text, in glossary order
+
+        Args:
+            text (str): The article
+        """
+
+        terms, _ = self.scan(text)
+        return [self.entries[index] for index in sorted(terms)]
+
+    def render(self, entries):
+        """Render entries for the user message, grouped by category
+
+        Args:
+            entries (list): The entries, as returned by match
+
+        Returns:
+            str: The <glossary> element, or "" without entries
+        """
+
+        if not entries:
+            return ""
+        lines = ["<glossary>"]
+        category = None
+        for entry in entries:
+            if entry["category"] != category:
+                if category is not None:
+                    lines.append(f"</{category}>")
+                category = entry["category"]
+                lines.append(f"<{category}>")
+            lines.append(f"- {entry['term']}: {entry['translation']}")
+        lines += [f"</{category}>", "</glossary>", ""]
+        return "\n".join(lines)
+
+    def check(self, article, output):
+        """Find the terms of the article the output renders without their required translation
+
+        Args:
+            article (str): The text sent to the model
+            output (str): The text produced by the model
+
+        Returns:
+            list: The entries whose term appears in the article but whose output has neither
+                their translation nor the term itself (kept in English)
+        """
+
+        required, _ = self.scan(article)
+        terms, translations = self.scan(output)
+        return [self.entries[index] for index in sorted(required - terms - translations)]
+
+
+_glossaries = {}
+
+
+def load_glossary(name):
+    """Read a glossary from the glossaries directory, once per container
+
+    Args:
+        name (str): The glossary name, i.e., the file name without ".json"
+    """
+
+    if name not in _glossaries:
+        with open(os.path.join(GLOSSARIES_DIR, f"{name}.json"), encoding="utf-8") as f:
+            _glossaries[name] = Glossary(json.load(f))
+    return _glossaries[name]
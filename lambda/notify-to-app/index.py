@@ -1,29 +1,67 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import json
-import os
-import re
-import time
-import traceback
-import urllib.parse
-import urllib.request
-from typing import Optional
-
-import boto3
-import cloudscraper
-from botocore.config import Config
-from botocore.exceptions import ClientError
-from bs4 import BeautifulSoup
-from strands import Agent
-from strands.models import BedrockModel
+import startup
+
+# strands and cloudscraper are imported on first use (see create_agent and clients.py), so
+# that the init phase only loads what every invocation needs
+with startup.profile_imports():
+    import concurrent.futures
+    import json
+    import os
+    import time
+    import urllib.parse
+
+    from botocore.exceptions import ClientError
+
+    import dead_letters
+    import log
+    import metrics
+    import near_duplicates
+    import outbox
+    import slack
+    import summary_cache
+    import throttling
+    from clients import get_bedrock_model, get_webhook_url, http_session
+    from extractor import extract_content
+    from summarizers import get_summarizer, load_template
+    from tag_parser import BatchStreamParser, TagStreamParser
+    from token_budget import estimate_tokens, split_into_chunks
 
 MODEL_ID = os.environ["MODEL_ID"]
 MODEL_REGION = os.environ["MODEL_REGION"]
+# Called when the model is throttled or its circuit breaker is open (defaults to the same model or Region)
+FALLBACK_MODEL_ID = os.environ.get("FALLBACK_MODEL_ID")
+FALLBACK_MODEL_REGION = os.environ.get("FALLBACK_MODEL_REGION")
 NOTIFIERS = json.loads(os.environ["NOTIFIERS"])
-SUMMARIZERS = json.loads(os.environ["SUMMARIZERS"])
-
-ssm = boto3.client("ssm")
+# Add a Bedrock prompt cache checkpoint after the system prompt (the model must support prompt caching)
+PROMPT_CACHING = os.environ.get("PROMPT_CACHING", "false").lower() == "true"
+# Stream model responses and stop generating once </twitter> is received
+STREAMING_SUMMARY = os.environ.get("STREAMING_SUMMARY", "true").lower() == "true"
+
+# Articles of a stream batch are scraped and summarized in parallel, then posted in order
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "4"))
+# Stop posting when less than this remains of the invocation, and let the stream retry the rest
+REMAINING_TIME_MARGIN_MS = 20000
+
+# Articles over MAX_INPUT_TOKENS (estimated locally) are split into chunks of CHUNK_TOKENS,
+# condensed in parallel, and the condensed notes are summarized instead
+MAX_INPUT_TOKENS = int(os.environ.get("MAX_INPUT_TOKENS", "12000"))
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "6000"))
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", "3"))
+MAX_CONDENSE_ROUNDS = 3
+CONDENSE_PROMPT = load_template("condense")
+
+# Articles of the same summarizer are summarized together in one model call, up to
+# SUMMARY_BATCH_ITEMS articles and SUMMARY_BATCH_TOKENS estimated input tokens per call.
+# 1 summarizes each article on its own.
+SUMMARY_BATCH_ITEMS = int(os.environ.get("SUMMARY_BATCH_ITEMS", "1"))
+SUMMARY_BATCH_TOKENS = int(os.environ.get("SUMMARY_BATCH_TOKENS", "6000"))
+BATCH_PROMPT = load_template("batch")
+
+# Advanced when push_notification returns. Model streams still running in its worker threads
+# stop at their next event, instead of resuming in a later invocation once the container thaws.
+_invocation = 0
 
 
 def get_blog_content(url):
@@ -37,259 +75,145 @@ def get_blog_content(url):
     """
 
     if not url.lower().startswith(("http://", "https://")):
-        print(f"Invalid URL: {url}")
+        log.warning("Invalid URL", url=url)
         return None
 
-    # create a cloudscraper instance
-    scraper = cloudscraper.create_scraper()
-
     # dummy User-Agent
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
     }
 
     try:
-        response = scraper.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        main = soup.find("main")
-
-        return main.text if main else None
+        # reuse an idle cloudscraper session of the host
+        with http_session(url) as scraper:
+            return extract_content(scraper, url, headers, timeout=5)
 
     except Exception as e:
-        print(f"Error accessing {url}: {e}")
+        log.warning("Failed to read the article", url=url, error=str(e))
         return None
 
 
-
-def get_bedrock_client(
-    assumed_role: Optional[str] = None,
-    region: Optional[str] = None,
-    runtime: Optional[bool] = True,
-):
-    """Create a boto3 client for Amazon Bedrock, with optional configuration overrides
+def create_agent(model, system_prompt):
+    """Create a Strands agent, importing the SDK on first use
 
     Args:
-        assumed_role (Optional[str]): Optional ARN of an AWS IAM role to assume for calling the Bedrock service. If not
-            specified, the current active credentials will be used.
-        region (Optional[str]): Optional name of the AWS Region in which the service should be called (e.g. "us-east-1").
-            If not specified, AWS_REGION or AWS_DEFAULT_REGION environment variable will be used.
-        runtime (Optional[bool]): Optional choice of getting different client to perform operations with the Amazon Bedrock service.
-    """
+        model (strands.models.BedrockModel): The model
+        system_prompt (str): The system prompt
 
-    if region is None:
-        target_region = os.environ.get(
-            "AWS_REGION", os.environ.get("AWS_DEFAULT_REGION")
-        )
-    else:
-        target_region = region
-
-    print(f"Create new client\n  Using region: {target_region}")
-    session_kwargs = {"region_name": target_region}
-    client_kwargs = {**session_kwargs}
-
-    profile_name = os.environ.get("AWS_PROFILE")
-    if profile_name:
-        print(f"  Using profile: {profile_name}")
-        session_kwargs["profile_name"] = profile_name
-
-    retry_config = Config(
-        region_name=target_region,
-        retries={
-            "max_attempts": 10,
-            "mode": "standard",
-        },
-    )
-    session = boto3.Session(**session_kwargs)
+    Returns:
+        strands.Agent: The agent
+    """
 
-    if assumed_role:
-        print(f"  Using role: {assumed_role}", end="")
-        sts = session.client("sts")
-        response = sts.assume_role(
-            RoleArn=str(assumed_role), RoleSessionName="langchain-llm-1"
-        )
-        print(" ... successful!")
-        client_kwargs["aws_access_key_id"] = response["Credentials"]["AccessKeyId"]
-        client_kwargs["aws_secret_access_key"] = response["Credentials"][
-            "SecretAccessKey"
-        ]
-        client_kwargs["aws_session_token"] = response["Credentials"]["SessionToken"]
-
-    if runtime:
-        service_name = "bedrock-runtime"
-    else:
-        service_name = "bedrock"
+    from strands import Agent
 
-    bedrock_client = session.client(
-        service_name=service_name, config=retry_config, **client_kwargs
+    return Agent(
+        model=model,
+        system_prompt=system_prompt,
+        callback_handler=None,
     )
 
-    return bedrock_client
 
+def stream_model(model, system_prompt, user_text, parser):
+    """Stream a response, feeding the parser and stopping once it has all sections
+
+    ConverseStream is called here rather than through a Strands agent: the agent reads the
+    stream in a worker thread that keeps consuming it after the caller stops, so generation
+    would not stop early. Closing the event stream from the reading thread ends the request.
+    The request itself is built by the Strands model, so it matches a non-streamed call.
 
-def summarize_blog(
-    blog_body,
-    language,
-    persona,
-    summarizer_name,
-):
-    """Summarize the content of a blog post
     Args:
-        blog_body (str): The content of the blog post to be summarized
-        language (str): The language for the summary
-        persona (str): The persona to use for the summary
-        summarizer_name (str): The name of the summarizer to use
+        model (strands.models.BedrockModel): The model
+        system_prompt (str): The system prompt
+        user_text (str): The user message
+        parser (TagStreamParser): Receives the text as it arrives, or None
 
     Returns:
-        str: The summarized text
+        tuple: (the text received, the token usage reported by the model, or None when the
+            stream was stopped before the final metadata event)
     """
 
-    print(f"Summarizing blog with summarizer: {summarizer_name}")
-    boto3_bedrock = get_bedrock_client(
-        assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
-        region=MODEL_REGION,
+    request = model.format_request(
+        [{"role": "user", "content": [{"text": user_text}]}],
+        system_prompt_content=[{"text": system_prompt}],
     )
+    pieces = []
+    usage = None
+    invocation = _invocation
+    stream = model.client.converse_stream(**request)["stream"]
+    try:
+        for event in stream:
+            if _invocation != invocation:
+                raise concurrent.futures.CancelledError("The invocation has returned")
+            if "metadata" in event:
+                usage = event["metadata"].get("usage")
+                continue
+            text = event.get("contentBlockDelta", {}).get("delta", {}).get("text")
+            if not text:
+                continue
+            pieces.append(text)
+            if parser is not None and parser.feed(text):
+                log.debug("All sections received, stop generation")
+                break
+    finally:
+        stream.close()
+    return "".join(pieces), usage
+
+
+def record_usage(usage, system_prompt, user_text, output, **dimensions):
+    """Record the tokens of a model call as metrics
+
+    When the model did not report its usage (e.g., the stream was stopped before the final
+    metadata event), the tokens are estimated from the text instead.
+
+    Args:
+        usage (dict): The usage reported by the model, or None
+        system_prompt (str): The system prompt
+        user_text (str): The user message
+        output (str): The text of the response
+        dimensions: Dimensions of the metrics, e.g., Summarizer
+    """
 
-    if summarizer_name == "AwsSolutionsArchitectJapanese":
-        prompt_data = f"""
-<persona>You are a professional {persona} with deep expertise in cloud technologies and enterprise solutions. </persona>
-<instruction>
-Analyze the AWS update in <input></input> tags and provide structured insights focusing on:
-- What specific new feature, service, or enhancement is being announced
-- Which AWS services are involved or affected
-- What technical benefits this provides (performance, cost, scalability, security, etc.)
-- Who would benefit most from this update (enterprise users, developers, specific industries, etc.)
-- Any important technical requirements, limitations, or prerequisites
-
-IMPORTANT: When writing in Japanese, use consistent and accurate translations for all AWS service names and technical terms. Maintain professional terminology throughout.
-
-Output your analysis in <thinking></thinking> tags using bullet points (each starting with "- " and ending with "\n").
-Create a concise summary following <summaryRule></summaryRule> and format according to <outputFormat></outputFormat>.
-Generate a Twitter-ready summary for the <twitter></twitter> section following <twitterRules></twitterRules>.
-</instruction>
-<outputLanguage>In {language}.</outputLanguage>
-<summaryRule>The final summary must be 2-3 sentences that clearly explain the new AWS feature/update, its key benefits, and target audience in a professional yet accessible tone.</summaryRule>
-<twitterRules>
-STRICT RULES for Twitter summary:
-- NEVER use exclamation marks or show excessive excitement
-- State objective facts concisely and professionally
-- NO hashtags whatsoever
-- Keep within 200 characters
-- Use neutral, informative tone
-- Focus on factual information only
-</twitterRules>
-<outputFormat><thinking>(detailed bullet point analysis of the AWS update)</thinking><summary>(concise professional summary of the update)</summary><twitter>(Twitter-ready summary within 200 characters following twitterRules strictly)</twitter></outputFormat>
-Follow the instructions carefully and focus on technical accuracy and practical implications. When outputting in Japanese, ensure consistent and professional translation of all technical terms and service names.
-"""
-    elif summarizer_name == "Formula1ProfessionalJapanese":
-        prompt_data = f"""
-<persona>You are a professional {persona} with extensive knowledge of F1 racing, teams, drivers, regulations, and the motorsport industry. </persona>
-<instruction>
-Analyze the Formula 1 news in <input></input> tags and provide comprehensive insights covering:
-- What is the main F1-related development or news story being reported
-- Which F1 teams, drivers, circuits, or officials are involved
-- How this impacts the current F1 season, championships, or future races
-- What are the technical, regulatory, or strategic implications
-- Why this news matters to F1 fans, teams, or the sport overall
-
-IMPORTANT: When writing in Japanese, you MUST use the exact translations provided in the glossary section below for all names, teams, and technical terms. This is mandatory and non-negotiable.
-
-Output your analysis in <thinking></thinking> tags using bullet points (each starting with "- " and ending with "\n").
-Create an engaging summary following <summaryRule></summaryRule> and format according to <outputFormat></outputFormat>.
-Generate a Twitter-ready summary for the <twitter></twitter> section following <twitterRules></twitterRules>.
-</instruction>
-<glossary>
-MANDATORY TRANSLATION RULES - You MUST follow these translations exactly:
-When translating to Japanese, you are REQUIRED to use the following proper nouns and technical terms exactly as specified. DO NOT use any other translations or variations:
-
-<names>
-- Max Verstappen: マックス・フェルスタッペン
-- Yuki Tsunoda: 角田裕毅
-- Lewis Hamilton: ルイス・ハミルトン
-- Charles Leclerc: シャルル・ルクレール
-- Lando Norris: ランド・ノリス
-- Oscar Piastri: オスカー・ピアストリ
-- George Russell: ジョージ・ラッセル
-- Kimi Antonelli: キミ・アントネッリ
-- Carlos Sainz: カルロス・サインツ
-- Alex Albon: アレックス・アルボン
-- Fernando Alonso: フェルナンド・アロンソ
-- Lance Stroll: ランス・ストロール
-- Pierre Gasly: ピエール・ガスリー
-- Franco Colapinto: フランコ・コラピント
-- Esteban Ocon: エスタバン・オコン
-- Oliver Bearman: オリバー・ベアマン
-- Nico Hulkenberg: ニコ・ヒュルケンベルグ
-- Gabriel Bortoleto: ガブリエル・ボルトレート
-- Isack Hadjar: アイザック・ハジャー
-- Liam Lawson: リアム・ローソン
-- Sergio Perez: セルジオ・ペレス
-- Valtteri Bottas: バルテリ・ボッタス
-- Sebastian Vettel: セバスチャン・ベッテル
-- Kimi Räikkönen: キミ・ライックネン
-- Christian Horner: クリスチャン・ホーナー
-- Toto Wolff: トト・ウォルフ
-- Frédéric Vasseur: フレデリック・バスール
-- Ayao Komatsu: 小松礼雄
-</names>
-
-<teams>
-- Red Bull Racing: レッドブル・レーシング
-- Mercedes: メルセデス
-- Ferrari: フェラーリ
-- McLaren: マクラーレン
-- Alpine: アルピーヌ
-- Aston Martin: アストンマーチン
-- Williams: ウィリアムズ
-- Haas: ハース
-- Alfa Romeo: アルファロメオ
-- Racing Bulls: レーシング・ブルズ
-- KICK Sauber: キックザウバー
-</teams>
-
-<technical_terms>
-- Qualifying: 予選
-- Practice: フリー走行
-- Sprint Race: スプリントレース
-- Safety Car: セーフティカー
-- Virtual Safety Car: バーチャルセーフティカー
-- Undercut: アンダーカット
-- Overcut: オーバーカット
-- Slipstream: スリップストリーム
-- Toe: トゥ
-- Downforce: ダウンフォース
-- Ground Effect: グラウンドエフェクト
-- Porpoising: ポーポイジング
-- Parc Fermé: パルクフェルメ
-</technical_terms>
-
-CRITICAL: If any of these terms appear in the content, you MUST use the exact Japanese translation provided above. Using any other translation is strictly forbidden and will be considered an error.
-</glossary>
-<outputLanguage>In {language}.</outputLanguage>
-<summaryRule>The final summary must be 2-3 sentences that capture the significance of the F1 news, explaining what happened and why it matters to fans in a professional tone.</summaryRule>
-<twitterRules>
-STRICT RULES for Twitter summary:
-- NEVER use exclamation marks or show excessive excitement
-- State objective facts concisely and professionally
-- NO hashtags whatsoever
-- Keep within 200 characters
-- Use neutral, informative tone
-- Focus on factual information only
-- Avoid emotional language or superlatives
-</twitterRules>
-<outputFormat><thinking>(detailed bullet point analysis of the F1 news)</thinking><summary>(professional summary that captures the significance of the F1 news)</summary><twitter>(Twitter-ready summary within 200 characters following twitterRules strictly)</twitter></outputFormat>
-Follow the instructions carefully and maintain professionalism while providing accurate information. 
-
-MANDATORY GLOSSARY COMPLIANCE: When outputting in Japanese, you MUST strictly adhere to the proper noun translations provided in the glossary above. Any deviation from these translations is strictly prohibited. Before finalizing your output, verify that all names, teams, and technical terms use the exact Japanese translations specified in the glossary.
-"""
+    if usage:
+        input_tokens = usage.get("inputTokens", 0)
+        output_tokens = usage.get("outputTokens", 0)
+        cache_read_tokens = usage.get("cacheReadInputTokens", 0)
+    else:
+        input_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_text)
+        output_tokens = estimate_tokens(output)
+        cache_read_tokens = 0
+        metrics.put_metric("EstimatedUsage", 1, **dimensions)
+    metrics.put_metric("InputTokens", input_tokens, **dimensions)
+    metrics.put_metric("OutputTokens", output_tokens, **dimensions)
+    metrics.put_metric("CacheReadInputTokens", cache_read_tokens, **dimensions)
+
+
+def invoke_model(system_prompt, user_text, parser=None, **dimensions):
+    """Send one request to the model and return its text output
+
+    The call goes through the concurrency limiter and the circuit breaker of the model (see
+    throttling.py). When the model is throttled or its circuit is open, the fallback model is
+    called instead, if one is configured.
+
+    Args:
+        system_prompt (str): The system prompt
+        user_text (str): The user message
+        parser (TagStreamParser): Optional parser that receives the output. When streaming,
+            generation stops as soon as the parser has received the last section.
+        dimensions: Dimensions of the token metrics, e.g., Summarizer
+
+    Returns:
+        str: The text of the response
+
+    Raises:
+        throttling.CircuitOpenError: The circuit breakers of all the models are open
+    """
 
     max_tokens = 4096
 
     ## Use Bedrock API
     # system_prompts = [
     #     {
-    #         "text": prompt_data
+    #         "text": system_prompt
     #     }
     # ]
 
@@ -298,7 +222,7 @@ MANDATORY GLOSSARY COMPLIANCE: When outputting in Japanese, you MUST strictly ad
     #         "role": "user",
     #         "content": [
     #             {
-    #                 "text": f"<input>{blog_body}</input>"
+    #                 "text": user_text
     #             }
     #         ]
     #     }
@@ -315,6 +239,10 @@ MANDATORY GLOSSARY COMPLIANCE: When outputting in Japanese, you MUST strictly ad
     #         "topK": 250
     #     }
     # }
+    # boto3_bedrock = get_bedrock_client(
+    #     assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
+    #     region=MODEL_REGION,
+    # )
     # try:
     #     response = boto3_bedrock.converse(
     #         system=system_prompts,
@@ -327,7 +255,40 @@ MANDATORY GLOSSARY COMPLIANCE: When outputting in Japanese, you MUST strictly ad
     #    outputText = response["output"]["message"]["content"][0]["text"]
 
     ## Use Strands API
-    model = BedrockModel(
+    targets = [(MODEL_ID, MODEL_REGION)]
+    if FALLBACK_MODEL_ID or FALLBACK_MODEL_REGION:
+        targets.append((FALLBACK_MODEL_ID or MODEL_ID, FALLBACK_MODEL_REGION or MODEL_REGION))
+    for number, (model_id, region) in enumerate(targets, 1):
+        try:
+            with throttling.get_guard(model_id, region).call():
+                return call_model(model_id, region, system_prompt, user_text, parser, max_tokens, dimensions)
+        except Exception as e:
+            fallback = isinstance(e, throttling.CircuitOpenError) or throttling.is_throttle(e)
+            if number == len(targets) or not fallback:
+                raise
+            log.warning("Model unavailable, calling the fallback model", model=model_id, region=region, error=str(e))
+            metrics.put_metric("FallbackCalls", 1, **dimensions)
+
+
+def call_model(model_id, region, system_prompt, user_text, parser, max_tokens, dimensions):
+    """Send one request to a model with Strands (see invoke_model)
+
+    Args:
+        model_id (str): The Bedrock model ID
+        region (str): The Region to call the model in
+        system_prompt (str): The system prompt
+        user_text (str): The user message
+        parser (TagStreamParser): Optional parser that receives the output
+        max_tokens (int): The maximum number of output tokens
+        dimensions (dict): Dimensions of the token metrics
+
+    Returns:
+        str: The text of the response
+    """
+
+    model = get_bedrock_model(
+        model_id=model_id,
+        region=region,
         params={
             "temperature": 1.0,
             "top_p": 1.0,
@@ -336,86 +297,516 @@ MANDATORY GLOSSARY COMPLIANCE: When outputting in Japanese, you MUST strictly ad
         additional_request_fields={
             "reasoning_effort": "medium"
         },
-        model_id=MODEL_ID,
-        region_name=MODEL_REGION,
-        streaming=False,
+        assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
+        cache_prompt="default" if PROMPT_CACHING else None,
+        streaming=STREAMING_SUMMARY,
     )
 
-    agent = Agent(
-        model=model,
-        system_prompt=prompt_data,
-        callback_handler=None,
-    )
     try:
-        response = agent(blog_body)
-
-        outputText = None
-        for content in response.message["content"]:
-            if "text" in content:
-                outputText = content["text"]
-                break
-
-        if outputText is None:
-            raise ValueError("No text content found in response")
-        # extract contant inside <summary> tag
-        summary = re.findall(r"<summary>([\s\S]*?)</summary>", outputText)[0]
-        detail = re.findall(r"<thinking>([\s\S]*?)</thinking>", outputText)[0]
-        twitter = re.findall(r"<twitter>([\s\S]*?)</twitter>", outputText)[0]
+        if STREAMING_SUMMARY:
+            text, usage = stream_model(model, system_prompt, user_text, parser)
+            record_usage(usage, system_prompt, user_text, text, **dimensions)
+            return text
+        response = create_agent(model, system_prompt)(user_text)
     except ClientError as error:
         if error.response["Error"]["Code"] == "AccessDeniedException":
-            print(
-                f"{error.response['Error']['Message']}"
-                "\nTo troubeshoot this issue please refer to the following resources:\n"
-                "https://docs.aws.amazon.com/IAM/latest/UserGuide/troubleshoot_access-denied.html\n"
-                "https://docs.aws.amazon.com/bedrock/latest/userguide/security-iam.html\n"
+            log.error(
+                "Access denied to Amazon Bedrock",
+                error=error.response["Error"]["Message"],
+                troubleshooting=[
+                    "https://docs.aws.amazon.com/IAM/latest/UserGuide/troubleshoot_access-denied.html",
+                    "https://docs.aws.amazon.com/bedrock/latest/userguide/security-iam.html",
+                ],
             )
-        else:
-            raise error
+        raise error
+
+    usage = getattr(getattr(response, "metrics", None), "accumulated_usage", None)
+    for content in response.message["content"]:
+        if "text" in content:
+            record_usage(usage, system_prompt, user_text, content["text"], **dimensions)
+            if parser is not None:
+                parser.feed(content["text"])
+            return content["text"]
+    raise ValueError("No text content found in response")
+
+
+def condense_article(blog_body, summarizer_name=None):
+    """Reduce an article that exceeds the input budget to notes that fit it
+
+    The article is split into chunks that are condensed in parallel (map), and the notes
+    are joined in article order (reduce). This repeats while the notes are still too long.
+
+    Args:
+        blog_body (str): The content of the blog post
+        summarizer_name (str): The summarizer the notes are for, used as a metric dimension
+
+    Returns:
+        str: Notes covering the whole article, within MAX_INPUT_TOKENS
+    """
+
+    for _ in range(MAX_CONDENSE_ROUNDS):
+        if estimate_tokens(blog_body) <= MAX_INPUT_TOKENS:
+            break
+        chunks = split_into_chunks(blog_body, CHUNK_TOKENS)
+        log.info("Article exceeds the input budget, condensing", max_input_tokens=MAX_INPUT_TOKENS, chunks=len(chunks))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+            notes = executor.map(
+                lambda chunk: invoke_model(
+                    CONDENSE_PROMPT,
+                    f"<input>{chunk}</input>",
+                    Summarizer=summarizer_name,
+                    Call="condense",
+                ),
+                chunks,
+            )
+            blog_body = "\n\n".join(notes)
+    return blog_body
+
+
+def glossary_prompt(summarizer, text):
+    """Render the glossary entries that apply to the text sent to a summarizer
+
+    Only the entries whose term appears in the text are sent, next to the text rather than
+    in the system prompt, so that the system prompt stays the same (cacheable) prefix.
+
+    Args:
+        summarizer (dict): The summarizer, as returned by get_summarizer
+        text (str): The article(s) to summarize
+
+    Returns:
+        str: The <glossary> element, or "" if the summarizer has no glossary or none applies
+    """
+
+    glossary = summarizer["glossary"]
+    if glossary is None:
+        return ""
+    entries = glossary.match(text)
+    metrics.put_metric("GlossaryEntries", len(entries), Summarizer=summarizer["name"])
+    return glossary.render(entries)
+
 
+def check_glossary(summarizer, article, summary, detail, twitter):
+    """Report the glossary terms of an article its summary renders without their translation
+
+    Args:
+        summarizer (dict): The summarizer, as returned by get_summarizer
+        article (str): The article sent to the model
+        summary (str): The summary
+        detail (str): The analysis
+        twitter (str): The post for X
+    """
+
+    glossary = summarizer["glossary"]
+    if glossary is None:
+        return
+    missed = glossary.check(article, "\n".join((summary, detail, twitter)))
+    metrics.put_metric("GlossaryViolations", len(missed), Summarizer=summarizer["name"])
+    if missed:
+        log.warning(
+            "Glossary terms without their translation",
+            summarizer=summarizer["name"],
+            terms={entry["term"]: entry["translation"] for entry in missed},
+        )
+
+
+def summarize_blog(
+    blog_body,
+    summarizer_name,
+):
+    """Summarize the content of a blog post
+    Args:
+        blog_body (str): The content of the blog post to be summarized
+        summarizer_name (str): The name of the summarizer to use
+
+    Returns:
+        str: The summarized text
+    """
+
+    log.info("Summarizing article", summarizer=summarizer_name)
+    summarizer = get_summarizer(summarizer_name)
+    prompt_data = summarizer["system_prompt"]
+
+    # Articles within the input budget are sent as is
+    blog_body = condense_article(blog_body, summarizer_name)
+    user_text = glossary_prompt(summarizer, blog_body) + f"<input>{blog_body}</input>"
+
+    # extract contant inside <thinking>, <summary> and <twitter> tags
+    parser = TagStreamParser()
+    invoke_model(prompt_data, user_text, parser, Summarizer=summarizer_name, Call="summarize")
+    summary, detail, twitter = parser.result()
+    check_glossary(summarizer, blog_body, summary, detail, twitter)
     return summary, detail, twitter
 
 
-def push_notification(item_list):
-    """Notify the arrival of articles
+def read_item(item):
+    """Fetch an article and find out whether the model has to summarize it
+
+    Items that need no model call are completed here: an article without content gets its
+    title as the summary, a near-duplicate gets "duplicate_of", and a cached summary is used
+    as is.
+
+    Args:
+        item (dict): The article to be notified
+
+    Returns:
+        dict: The "content", "summarizer" and "cache_key" of the article to summarize, or None
+            if the item is complete
+    """
+
+    notifier = NOTIFIERS[item["rss_notifier_name"]]
+
+    # Get the blog context
+    with metrics.stage("extract", Notifier=item["rss_notifier_name"]):
+        content = get_blog_content(item["rss_link"])
+
+    if not content:
+        # Do not ask the model to summarize nothing; notify the title and link only
+        log.warning("No content found, notify without summary", url=item["rss_link"])
+        item["summary"] = ""
+        item["detail"] = ""
+        item["twitter"] = item["rss_title"]
+        return None
+
+    # Another URL (e.g., in an overlapping feed) may carry the same story; notify it only once
+    duplicate_of = near_duplicates.claim(
+        item["rss_notifier_name"], item["rss_link"], item["rss_title"], content
+    )
+    if duplicate_of:
+        log.info("Near-duplicate skipped", url=item["rss_link"], duplicate_of=duplicate_of)
+        metrics.put_metric("NearDuplicates", 1, Notifier=item["rss_notifier_name"])
+        item["duplicate_of"] = duplicate_of
+        return None
+
+    # Summarize the blog, unless the same article was already summarized by the same summarizer
+    summarizer = get_summarizer(notifier["summarizerName"])
+    key = summary_cache.cache_key(content, summarizer["name"], MODEL_ID, summarizer["version"])
+    cached = summary_cache.get_summary(key)
+    metrics.put_metric("SummaryCacheHit" if cached else "SummaryCacheMiss", 1, Summarizer=summarizer["name"])
+    if cached:
+        log.info("Summary cache hit", url=item["rss_link"])
+        set_summary(item, *cached)
+        return None
+    return {"content": content, "summarizer": summarizer, "cache_key": key}
+
+
+def set_summary(item, summary, detail, twitter):
+    """Add the summary text to the notified message
+
+    Args:
+        item (dict): The article to be notified
+        summary (str): The summary
+        detail (str): The analysis
+        twitter (str): The post for X
+    """
+
+    item["summary"] = summary
+    item["detail"] = detail
+    item["twitter"] = twitter.replace("\n", "")
+
+
+def summarize_item(item):
+    """Fetch and summarize an article, adding the summary to the item
+
+    An article with the same story as one already notified is not summarized; it gets
+    "duplicate_of" instead.
+
+    Args:
+        item (dict): The article to be notified
+    """
+
+    request = read_item(item)
+    if request is None:
+        return
+    summarizer_name = request["summarizer"]["name"]
+    with metrics.stage("summarize", Summarizer=summarizer_name):
+        summary, detail, twitter = summarize_blog(request["content"], summarizer_name=summarizer_name)
+    summary_cache.put_summary(request["cache_key"], summary, detail, twitter)
+    set_summary(item, summary, detail, twitter)
+
+
+def plan_batches(requests):
+    """Group the articles to summarize into batches of the same summarizer, in stream order
+
+    A batch is closed when it has SUMMARY_BATCH_ITEMS articles or the next article would take
+    it over SUMMARY_BATCH_TOKENS. An article over the budget on its own is a batch of one.
+
+    Args:
+        requests (list): (item, summary request, future) tuples, the request as returned by read_item
+
+    Returns:
+        list: The batches, as lists of the tuples
+    """
+
+    batches = []
+    # summarizer name -> [the open batch, its estimated tokens]
+    open_batches = {}
+    for entry in requests:
+        name = entry[1]["summarizer"]["name"]
+        tokens = estimate_tokens(entry[1]["content"])
+        batch = open_batches.get(name)
+        if batch is None or len(batch[0]) >= SUMMARY_BATCH_ITEMS or batch[1] + tokens > SUMMARY_BATCH_TOKENS:
+            batch = [[], 0]
+            batches.append(batch[0])
+            open_batches[name] = batch
+        batch[0].append(entry)
+        batch[1] += tokens
+    return batches
+
+
+def summarize_batch(batch):
+    """Summarize several articles of the same summarizer in one model call
+
+    Each article is sent in <article id="N"> tags and answered in the same tags. The articles
+    whose answer cannot be parsed, e.g., because the output was cut off, are summarized on
+    their own, unless the model is throttled or its circuit is open: their futures then get
+    that error. The future of each item is resolved once its message is ready; if anything else
+    fails on the way (or the thread is interrupted), every future still pending gets the error,
+    so that no caller waits on an article that will never be summarized.
+
+    Args:
+        batch (list): (item, summary request, future) tuples, as grouped by plan_batches
+    """
+
+    try:
+        summarize_batch_items(batch)
+    except BaseException as e:
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        raise
+
+
+def summarize_batch_items(batch):
+    """Summarize the articles of a batch and resolve their futures, as done by summarize_batch
+
+    Args:
+        batch (list): (item, summary request, future) tuples, as grouped by plan_batches
+    """
+
+    summarizer = batch[0][1]["summarizer"]
+    results = {}
+    # A throttled model is not called again for each article; they fail with this error instead
+    unavailable = None
+    if len(batch) > 1:
+        articles = "".join(
+            f'<article id="{number}">{request["content"]}</article>'
+            for number, (_, request, _) in enumerate(batch, 1)
+        )
+        user_text = glossary_prompt(summarizer, articles) + BATCH_PROMPT.format(count=len(batch), articles=articles)
+        parser = BatchStreamParser(len(batch))
+        log.info("Summarizing articles in one call", summarizer=summarizer["name"], articles=len(batch))
+        try:
+            with metrics.stage("summarize_batch", Summarizer=summarizer["name"]):
+                invoke_model(
+                    summarizer["system_prompt"],
+                    user_text,
+                    parser,
+                    Summarizer=summarizer["name"],
+                    Call="summarize_batch",
+                )
+        except Exception as e:
+            if isinstance(e, throttling.CircuitOpenError) or throttling.is_throttle(e):
+                unavailable = e
+            log.warning("Batched summarization failed", summarizer=summarizer["name"], error=str(e))
+        # The articles completed before a failure are used all the same
+        results = parser.results()
+        metrics.put_metric("BatchedArticles", len(results), Summarizer=summarizer["name"])
+        if unavailable is None:
+            metrics.put_metric("BatchFallbacks", len(batch) - len(results), Summarizer=summarizer["name"])
+
+    for number, (item, request, future) in enumerate(batch, 1):
+        try:
+            if number in results:
+                summary, detail, twitter = results[number]
+                check_glossary(summarizer, request["content"], summary, detail, twitter)
+            elif unavailable is not None:
+                raise unavailable
+            else:
+                with metrics.stage("summarize", Summarizer=summarizer["name"]):
+                    summary, detail, twitter = summarize_blog(request["content"], summarizer_name=summarizer["name"])
+            summary_cache.put_summary(request["cache_key"], summary, detail, twitter)
+            set_summary(item, summary, detail, twitter)
+            render_notification(item)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(None)
+
+
+def use_outbox_entry(item):
+    """Reuse the message rendered by an earlier attempt, if any
+
+    Args:
+        item (dict): The article to be notified
+
+    Returns:
+        bool: True if the outbox had an entry for the article
+    """
+
+    entry = outbox.get_entry(item)
+    if not entry:
+        return False
+    log.info("Outbox entry found", url=item["rss_link"], status=entry["status"])
+    item["message"] = entry["message"]
+    item["sent"] = entry["status"] == outbox.STATUS_SENT
+    return True
+
+
+def render_notification(item):
+    """Render the message of a summarized article and record it in the outbox
+
+    Args:
+        item (dict): The article to be notified
+    """
+
+    if item.get("duplicate_of"):
+        return
+    item["message"] = create_slack_message(item)
+    outbox.put_pending(item, item["message"])
+
+
+def prepare_notification(item):
+    """Render the message of an article, reusing the outbox entry of an earlier attempt
+
+    Args:
+        item (dict): The article to be notified
+    """
+
+    if use_outbox_entry(item):
+        return
+    summarize_item(item)
+    render_notification(item)
+
+
+def read_notification(item):
+    """Prepare the message of an article up to its summary, for batched summarization
+
+    Args:
+        item (dict): The article to be notified
+
+    Returns:
+        dict: The summary request of the article (see read_item), or None if the item is ready
+    """
+
+    if use_outbox_entry(item):
+        return None
+    request = read_item(item)
+    if request is None:
+        render_notification(item)
+    return request
+
+
+def prepare_notifications(item_list, executor):
+    """Prepare the messages of several articles, summarizing them in batches
+
+    The articles are fetched in parallel first; the ones that need the model are then grouped
+    by summarizer (see plan_batches) and each batch is summarized in one call.
 
     Args:
         item_list (list): List of articles to be notified
+        executor (concurrent.futures.Executor): Runs the fetches and the batches
+
+    Returns:
+        list: One future per article, resolved once its message is ready
     """
 
-    for item in item_list:
+    futures = []
+    requests = []
+    reads = [executor.submit(read_notification, item) for item in item_list]
+    for item, read in zip(item_list, reads):
+        future = concurrent.futures.Future()
+        futures.append(future)
+        try:
+            request = read.result()
+        except Exception as e:
+            future.set_exception(e)
+            continue
+        if request is None:
+            future.set_result(None)
+        else:
+            requests.append((item, request, future))
+    for batch in plan_batches(requests):
+        executor.submit(summarize_batch, batch)
+    return futures
 
-        notifier = NOTIFIERS[item["rss_notifier_name"]]
-        webhook_url_parameter_name = notifier["webhookUrlParameterName"]
-        ssm_response = ssm.get_parameter(Name=webhook_url_parameter_name, WithDecryption=True)
-        app_webhook_url = ssm_response["Parameter"]["Value"]
 
-        item_url = item["rss_link"]
+def post_notification(item):
+    """Post a summarized article to the app
 
-        # Get the blog context
-        content = get_blog_content(item_url)
+    Args:
+        item (dict): The article with its rendered message
+    """
 
-        # Summarize the blog
-        summarizer = SUMMARIZERS[notifier["summarizerName"]]
-        summary, detail, twitter = summarize_blog(content, language=summarizer["outputLanguage"], persona=summarizer["persona"], summarizer_name=notifier["summarizerName"])
+    if item.get("sent"):
+        log.info("Already posted, skip", url=item["rss_link"])
+        return
+    if item.get("duplicate_of"):
+        return
 
-        # Add the summary text to notified message
-        item["summary"] = summary
-        item["detail"] = detail
-        item["twitter"] = twitter
+    notifier = NOTIFIERS[item["rss_notifier_name"]]
+    app_webhook_url = get_webhook_url(notifier["webhookUrlParameterName"])
 
-        item["twitter"] = item["twitter"].replace("\n", "")
-        msg = create_slack_message(item)
+    log.debug("Posting message", payload=lambda: item["message"])
+    with metrics.stage("post", Notifier=item["rss_notifier_name"]):
+        response = slack.post(app_webhook_url, item["message"])
+    log.info("Posted", url=item["rss_link"], response=lambda: response.decode("utf-8", "replace"))
+    outbox.mark_sent(item)
 
-        encoded_msg = json.dumps(msg).encode("utf-8")
-        # print("push_msg:{}".format(item))
-        print("push_msg:{}".format(msg))
-        headers = {
-            "Content-Type": "application/json",
-        }
-        req = urllib.request.Request(app_webhook_url, encoded_msg, headers)
-        with urllib.request.urlopen(req) as res:
-            print(res.read())
-        time.sleep(0.5)
+
+def push_notification(item_list, context=None):
+    """Notify the arrival of articles
+
+    Articles are summarized concurrently (in batches with SUMMARY_BATCH_ITEMS > 1), but posted
+    in stream order. Posting stops at the first article that fails or is not ready before the
+    remaining time runs out, because the stream retries the batch from that record onwards.
+    When the model's circuit breaker is open, the rest of the batch is deferred: the invocation
+    waits for the breaker cooldown (within its remaining time) before reporting the failure, so
+    that the stream retries once the model may be called.
+
+    Args:
+        item_list (list): List of articles to be notified
+        context: The Lambda context, used to stop before the invocation times out
+
+    Returns:
+        dict: The first article that could not be notified, or None if all were notified
+    """
+
+    global _invocation
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=SUMMARY_WORKERS)
+    try:
+        if SUMMARY_BATCH_ITEMS > 1:
+            futures = prepare_notifications(item_list, executor)
+        else:
+            futures = [executor.submit(prepare_notification, item) for item in item_list]
+        for position, (item, future) in enumerate(zip(item_list, futures)):
+            if context and context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+                log.warning("Running out of time, retry from this record", url=item["rss_link"])
+                return item
+            timeout = None
+            if context:
+                timeout = (context.get_remaining_time_in_millis() - REMAINING_TIME_MARGIN_MS) / 1000
+            try:
+                future.result(timeout=timeout)
+                post_notification(item)
+            except concurrent.futures.TimeoutError:
+                log.warning("Running out of time, retry from this record", url=item["rss_link"])
+                return item
+            except throttling.CircuitOpenError as e:
+                log.warning("Model circuit open, defer from this record", url=item["rss_link"], retry_after=round(e.retry_after))
+                metrics.put_metric("DeferredRecords", len(item_list) - position)
+                wait = e.retry_after
+                if context:
+                    wait = min(wait, (context.get_remaining_time_in_millis() - REMAINING_TIME_MARGIN_MS) / 1000)
+                time.sleep(max(0, wait))
+                return item
+            except Exception:
+                log.error("Failed to notify", exc_info=True, url=item["rss_link"])
+                return item
+    finally:
+        _invocation += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+    return None
 
 
 def get_new_entries(blog_entries):
@@ -427,7 +818,7 @@ def get_new_entries(blog_entries):
 
     res_list = []
     for entry in blog_entries:
-        print(entry)
+        log.debug("Stream record", record=lambda: entry)
         if entry["eventName"] == "INSERT":
             new_data = {
                 "rss_category": entry["dynamodb"]["NewImage"]["category"]["S"],
@@ -435,14 +826,57 @@ def get_new_entries(blog_entries):
                 "rss_title": entry["dynamodb"]["NewImage"]["title"]["S"],
                 "rss_link": entry["dynamodb"]["NewImage"]["url"]["S"],
                 "rss_notifier_name": entry["dynamodb"]["NewImage"]["notifier_name"]["S"],
+                "sequence_number": entry["dynamodb"]["SequenceNumber"],
             }
-            print(new_data)
+            log.debug("New entry", entry=lambda: new_data)
             res_list.append(new_data)
         else:  # Do not notify for REMOVE or UPDATE events
-            print("skip REMOVE or UPDATE event")
+            log.debug("Skip REMOVE or UPDATE event", sample=True, event_name=entry["eventName"])
     return res_list
 
 
+def replay_dead_letters(context):
+    """Notify the articles of the stream batches that ran out of retry attempts
+
+    The batches are taken from the on-failure queue (see dead_letters.py) and read back from
+    the stream. A batch is removed from the queue once all its articles are notified; the
+    replay stops at the first batch that fails again, which stays in the queue for the next
+    replay.
+
+    Args:
+        context: The Lambda context, used to stop before the invocation times out
+
+    Returns:
+        dict: The number of batches "replayed", "expired" (no longer in the stream) and "failed"
+    """
+
+    result = {"replayed": 0, "expired": 0, "failed": 0}
+    near_duplicates.reset()
+    while context.get_remaining_time_in_millis() >= REMAINING_TIME_MARGIN_MS and not result["failed"]:
+        messages = dead_letters.receive()
+        if not messages:
+            break
+        for message in messages:
+            try:
+                records = dead_letters.read_records(message["batch"])
+            except dead_letters.ExpiredBatchError as e:
+                log.error("Failed batch no longer in the stream, not notified", batch=message["batch"], error=str(e))
+                dead_letters.delete(message)
+                result["expired"] += 1
+                continue
+            new_data = get_new_entries(records)
+            if new_data and push_notification(new_data, context) is not None:
+                # The messages not handled yet become visible again after the visibility timeout
+                result["failed"] += 1
+                break
+            dead_letters.delete(message)
+            result["replayed"] += 1
+    log.info("Failed batches replayed", **result)
+    metrics.put_metric("ReplayedBatches", result["replayed"])
+    metrics.put_metric("ExpiredBatches", result["expired"])
+    return result
+
+
 def create_slack_message(item):
     # URL encode the twitter text
     # encoded_twitter_text = urllib.parse.quote("🤖 < " + item["twitter"] + " (生成AIによる要約ポスト)")
@@ -465,12 +899,39 @@ def handler(event, context):
     """Notify about blog entries registered in DynamoDB
 
     Args:
-        event (dict): Information about the updated items notified from DynamoDB
+        event (dict): Information about the updated items notified from DynamoDB, or
+            {"mode": "replay"} to replay the batches of the on-failure queue
+
+    Returns:
+        dict: The partial batch response. The stream retries from the reported record.
     """
 
+    log.start(context)
+    if event.get("mode") == "replay":
+        try:
+            return replay_dead_letters(context)
+        finally:
+            log.finish()
+            metrics.flush()
+
     try:
         new_data = get_new_entries(event["Records"])
-        if 0 < len(new_data):
-            push_notification(new_data)
     except Exception:
-        print(traceback.print_exc())
+        # Fail the whole batch, so that bisecting, retries and the dead-letter queue still apply
+        log.error("Failed to read the stream records", exc_info=True)
+        log.finish()
+        metrics.flush()
+        raise
+
+    near_duplicates.reset()
+    try:
+        failed = push_notification(new_data, context) if new_data else None
+    finally:
+        log.finish()
+        metrics.flush()
+    if failed is None:
+        return {"batchItemFailures": []}
+    return {"batchItemFailures": [{"itemIdentifier": failed["sequence_number"]}]}
+
+
+startup.init_complete()
@@ -0,0 +1,172 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Detection of articles whose content was already notified under another URL
+
+The SimHash of each notified article is indexed by its bands in the near-duplicate table:
+one item per band and article, under the partition key "<notifier>#<band>" and the article URL
+as sort key. An article is compared with all the earlier ones that share a band before it is
+summarized.
+
+Near-identical content alone is not enough: templated announcements (e.g., "... now available
+in the <Region>") differ in a few words only. An article is a duplicate when its content is
+near-identical and it is the same story, i.e., its URL without the locale segment or its
+title (by SimHash) matches too.
+"""
+
+import os
+import threading
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import BotoCoreError, ClientError
+
+import fingerprint
+import log
+
+NEAR_DUPLICATE_DETECTION = os.environ.get("NEAR_DUPLICATE_DETECTION", "true").lower() == "true"
+# Articles whose SimHash differs in at most this many bits are the same story (less than BANDS)
+CONTENT_SIMHASH_DISTANCE = int(os.environ.get("CONTENT_SIMHASH_DISTANCE", "3"))
+# Titles whose SimHash differs in at most this many bits are the same (as in the crawler)
+TITLE_SIMHASH_DISTANCE = int(os.environ.get("TITLE_SIMHASH_DISTANCE", "0"))
+NEAR_DUPLICATE_TABLE_NAME = os.environ.get("NEAR_DUPLICATE_TABLE_NAME")
+NEAR_DUPLICATE_TTL_DAYS = int(os.environ.get("NEAR_DUPLICATE_TTL_DAYS", "30"))
+
+table = boto3.resource("dynamodb").Table(NEAR_DUPLICATE_TABLE_NAME) if NEAR_DUPLICATE_TABLE_NAME else None
+
+_lock = threading.Lock()
+# (notifier name, url, title signature, content signature) of the articles claimed in this invocation
+_claimed = []
+
+
+def reset():
+    """Forget the articles claimed in memory, e.g., at the start of an invocation"""
+
+    with _lock:
+        _claimed.clear()
+
+
+def band_key(notifier_name, band):
+    """Build the partition key of a SimHash band
+
+    Args:
+        notifier_name (str): The name of the notifier
+        band (str): The band, as returned by fingerprint.band_keys
+    """
+
+    return f"{notifier_name}#{band}"
+
+
+def same_story(url, title_signature, other_url, other_title_signature):
+    """Return whether two articles with near-identical content tell the same story
+
+    Args:
+        url (str): The URL of the article
+        title_signature (int): The title SimHash of the article
+        other_url (str): The URL of the other article
+        other_title_signature (int): The title SimHash of the other article
+    """
+
+    if fingerprint.story_key(url) == fingerprint.story_key(other_url):
+        return True
+    return fingerprint.hamming_distance(title_signature, other_title_signature) <= TITLE_SIMHASH_DISTANCE
+
+
+def find_indexed(notifier_name, url, title_signature, signature):
+    """Find an earlier article of the same story with a near-identical signature in the index
+
+    Args:
+        notifier_name (str): The name of the notifier
+        url (str): The URL of the article
+        title_signature (int): The title SimHash of the article
+        signature (int): The content SimHash of the article
+
+    Returns:
+        str: The URL of the earlier article, or None
+    """
+
+    for band in fingerprint.band_keys(signature):
+        query = {"KeyConditionExpression": Key("band_key").eq(band_key(notifier_name, band))}
+        while True:
+            try:
+                response = table.query(**query)
+            except (BotoCoreError, ClientError) as e:
+                log.warning("Near-duplicate lookup failed", error=str(e))
+                return None
+            for candidate in response["Items"]:
+                if candidate["url"] == url or int(candidate["expires_at"]) < time.time():
+                    continue
+                if fingerprint.hamming_distance(signature, int(candidate["simhash"], 16)) > CONTENT_SIMHASH_DISTANCE:
+                    continue
+                if same_story(url, title_signature, candidate["url"], int(candidate["title_simhash"], 16)):
+                    return candidate["url"]
+            if "LastEvaluatedKey" not in response:
+                break
+            query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return None
+
+
+def index(notifier_name, url, title_signature, signature):
+    """Index the signature of an article by its bands
+
+    Args:
+        notifier_name (str): The name of the notifier
+        url (str): The URL of the article
+        title_signature (int): The title SimHash of the article
+        signature (int): The content SimHash of the article
+    """
+
+    expires_at = int(time.time()) + NEAR_DUPLICATE_TTL_DAYS * 86400
+    try:
+        with table.batch_writer() as batch:
+            for band in fingerprint.band_keys(signature):
+                batch.put_item(
+                    Item={
+                        "band_key": band_key(notifier_name, band),
+                        "url": url,
+                        "simhash": f"{signature:016x}",
+                        "title_simhash": f"{title_signature:016x}",
+                        "expires_at": expires_at,
+                    }
+                )
+    except (BotoCoreError, ClientError) as e:
+        log.warning("Near-duplicate index write failed", error=str(e))
+
+
+def claim(notifier_name, url, title, content):
+    """Claim the story of an article for a notifier, unless another article already has it
+
+    Call this before summarizing, so that a near-duplicate costs neither a model call nor a post.
+
+    Args:
+        notifier_name (str): The name of the notifier
+        url (str): The URL of the article
+        title (str): The title of the article
+        content (str): The extracted article text
+
+    Returns:
+        str: The URL of the earlier article with the same story, or None if this article is new
+    """
+
+    if not NEAR_DUPLICATE_DETECTION:
+        return None
+    title_signature = fingerprint.title_simhash(title)
+    signature = fingerprint.content_simhash(content)
+    with _lock:
+        for name, other_url, other_title, other in _claimed:
+            if (
+                name == notifier_name
+                and other_url != url
+                and fingerprint.hamming_distance(signature, other) <= CONTENT_SIMHASH_DISTANCE
+                and same_story(url, title_signature, other_url, other_title)
+            ):
+                return other_url
+        _claimed.append((notifier_name, url, title_signature, signature))
+
+    if table is None:
+        return None
+    duplicate_of = find_indexed(notifier_name, url, title_signature, signature)
+    if duplicate_of is None:
+        index(notifier_name, url, title_signature, signature)
+    return duplicate_of
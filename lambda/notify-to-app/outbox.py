@@ -0,0 +1,97 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Outbox of rendered notifications, so that a retried record is neither summarized nor posted twice"""
+
+import json
+import os
+import time
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+import log
+
+OUTBOX_TABLE_NAME = os.environ.get("OUTBOX_TABLE_NAME")
+OUTBOX_TTL_DAYS = int(os.environ.get("OUTBOX_TTL_DAYS", "14"))
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+
+table = boto3.resource("dynamodb").Table(OUTBOX_TABLE_NAME) if OUTBOX_TABLE_NAME else None
+
+
+def outbox_key(item):
+    """Build the outbox key of an article
+
+    Args:
+        item (dict): The article to be notified
+    """
+
+    return f"{item['rss_notifier_name']}#{item['rss_link']}"
+
+
+def get_entry(item):
+    """Look up the outbox entry of an article
+
+    Args:
+        item (dict): The article to be notified
+
+    Returns:
+        dict: The entry with "message" (dict) and "status", or None if the article is not in the outbox
+    """
+
+    if table is None:
+        return None
+    try:
+        response = table.get_item(Key={"outbox_key": outbox_key(item)})
+    except (BotoCoreError, ClientError) as e:
+        log.warning("Outbox lookup failed", error=str(e))
+        return None
+    entry = response.get("Item")
+    if entry is None:
+        return None
+    return {"message": json.loads(entry["message"]), "status": entry["status"]}
+
+
+def put_pending(item, message):
+    """Store a rendered message before it is posted
+
+    Args:
+        item (dict): The article to be notified
+        message (dict): The rendered message
+    """
+
+    if table is None:
+        return
+    try:
+        table.put_item(
+            Item={
+                "outbox_key": outbox_key(item),
+                "message": json.dumps(message, ensure_ascii=False),
+                "status": STATUS_PENDING,
+                "expires_at": int(time.time()) + OUTBOX_TTL_DAYS * 86400,
+            }
+        )
+    except (BotoCoreError, ClientError) as e:
+        log.warning("Outbox write failed", error=str(e))
+
+
+def mark_sent(item):
+    """Record that the message of an article has been posted
+
+    Args:
+        item (dict): The article that was notified
+    """
+
+    if table is None:
+        return
+    try:
+        table.update_item(
+            Key={"outbox_key": outbox_key(item)},
+            UpdateExpression="SET #status = :sent",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":sent": STATUS_SENT},
+        )
+    except (BotoCoreError, ClientError) as e:
+        log.warning("Outbox update failed", error=str(e))
@@ -0,0 +1,204 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Webhook delivery over pooled keep-alive connections, rate limited per webhook"""
+
+import http.client
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.parse
+
+import log
+
+# Slack allows about one message per second per incoming webhook, with short bursts
+SLACK_RATE_PER_SECOND = float(os.environ.get("SLACK_RATE_PER_SECOND", "1"))
+SLACK_BURST = int(os.environ.get("SLACK_BURST", "3"))
+SLACK_MAX_ATTEMPTS = int(os.environ.get("SLACK_MAX_ATTEMPTS", "5"))
+SLACK_TIMEOUT = float(os.environ.get("SLACK_TIMEOUT", "10"))
+# Idle connections kept per host
+POOL_SIZE = 4
+
+_lock = threading.Lock()
+_pools = {}
+_buckets = {}
+
+
+class DeliveryError(Exception):
+    """The message could not be delivered to the webhook"""
+
+
+class TokenBucket:
+    """Allow `rate` requests per second on average, and up to `burst` at once"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request is allowed"""
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back all requests for a while, e.g., after a 429 response
+
+        Args:
+            seconds (float): The time to wait before the next request
+        """
+
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host"""
+
+    def __init__(self, scheme, host):
+        self.connection_class = (
+            http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        )
+        self.host = host
+        self.idle = queue.LifoQueue(maxsize=POOL_SIZE)
+
+    def get(self):
+        """Return an idle connection, or a new one"""
+
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connection_class(self.host, timeout=SLACK_TIMEOUT)
+
+    def put(self, connection):
+        """Return a connection to the pool after a complete response
+
+        Args:
+            connection (http.client.HTTPConnection): The connection
+        """
+
+        try:
+            self.idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+
+def get_pool(url):
+    """Return the connection pool of the host of a URL
+
+    Args:
+        url (urllib.parse.SplitResult): The parsed URL
+    """
+
+    key = (url.scheme, url.netloc)
+    with _lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(url.scheme, url.netloc)
+        return _pools[key]
+
+
+def get_bucket(webhook_url):
+    """Return the rate limiter of a webhook
+
+    Args:
+        webhook_url (str): The webhook URL
+    """
+
+    with _lock:
+        if webhook_url not in _buckets:
+            _buckets[webhook_url] = TokenBucket(SLACK_RATE_PER_SECOND, SLACK_BURST)
+        return _buckets[webhook_url]
+
+
+def backoff_seconds(attempt):
+    """Exponential backoff with full jitter
+
+    Args:
+        attempt (int): The number of attempts made so far
+    """
+
+    return random.uniform(0, min(30, 0.5 * 2**attempt))
+
+
+def retry_after_seconds(response, attempt):
+    """Read the Retry-After header of a 429 response
+
+    Args:
+        response (http.client.HTTPResponse): The response
+        attempt (int): The number of attempts made so far
+    """
+
+    try:
+        return float(response.getheader("Retry-After"))
+    except (TypeError, ValueError):
+        return backoff_seconds(attempt)
+
+
+def post(webhook_url, message):
+    """Post a message to a webhook, honoring rate limits and retrying transient failures
+
+    Args:
+        webhook_url (str): The webhook URL
+        message (dict): The message payload
+
+    Returns:
+        bytes: The response body
+
+    Raises:
+        DeliveryError: The message was rejected, or all attempts failed
+    """
+
+    url = urllib.parse.urlsplit(webhook_url)
+    path = url.path + (f"?{url.query}" if url.query else "")
+    body = json.dumps(message).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    pool = get_pool(url)
+    bucket = get_bucket(webhook_url)
+
+    for attempt in range(SLACK_MAX_ATTEMPTS):
+        bucket.acquire()
+        connection = pool.get()
+        try:
+            connection.request("POST", path, body, headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            # Stale keep-alive connections end up here as well
+            connection.close()
+            wait = backoff_seconds(attempt)
+            log.warning("Webhook request failed, retrying", error=str(e), wait=round(wait, 1))
+            time.sleep(wait)
+            continue
+
+        if response.will_close:
+            connection.close()
+        else:
+            pool.put(connection)
+
+        if response.status < 300:
+            return data
+        if response.status == 429:
+            wait = retry_after_seconds(response, attempt)
+            log.warning("Webhook rate limited, retrying", wait=round(wait, 1))
+            bucket.pause(wait)
+            continue
+        if response.status >= 500:
+            wait = backoff_seconds(attempt)
+            log.warning("Webhook server error, retrying", status=response.status, wait=round(wait, 1))
+            time.sleep(wait)
+            continue
+        raise DeliveryError(f"Webhook returned {response.status}: {data[:200]!r}")
+
+    raise DeliveryError(f"Webhook delivery failed after {SLACK_MAX_ATTEMPTS} attempts")
@@ -0,0 +1,81 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Registry of summarizers, built once per container from the SUMMARIZERS configuration"""
+
+import hashlib
+import json
+import os
+
+from glossary import load_glossary
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+# Used for summarizers that do not set "promptTemplate" in cdk.json
+DEFAULT_PROMPT_TEMPLATE = "aws_solutions_architect"
+
+
+def load_template(name):
+    """Read a prompt template from the prompts directory
+
+    Args:
+        name (str): The template name, i.e., the file name without ".txt"
+    """
+
+    with open(os.path.join(PROMPTS_DIR, f"{name}.txt"), encoding="utf-8") as f:
+        return f.read()
+
+
+def build_registry(summarizers):
+    """Render the system prompt of every configured summarizer
+
+    The system prompt depends only on the summarizer configuration, so it is rendered once
+    and sent as a static (cacheable) prefix. The article is the only per-call input.
+
+    Args:
+        summarizers (dict): The "summarizers" context from cdk.json
+
+    Returns:
+        dict: Mapping of summarizer name to {"name", "template", "system_prompt", "glossary",
+            "version"}. "glossary" is the Glossary named by the "glossary" setting, or None.
+    """
+
+    templates = {}
+    registry = {}
+    for name, config in summarizers.items():
+        template_name = config.get("promptTemplate", DEFAULT_PROMPT_TEMPLATE)
+        if template_name not in templates:
+            templates[template_name] = load_template(template_name)
+        system_prompt = templates[template_name].format(
+            persona=config["persona"], language=config["outputLanguage"]
+        )
+        glossary = load_glossary(config["glossary"]) if config.get("glossary") else None
+        version = system_prompt + (glossary.version if glossary else "")
+        registry[name] = {
+            "name": name,
+            "template": template_name,
+            "system_prompt": system_prompt,
+            "glossary": glossary,
+            # Changes whenever the rendered prompt or the glossary changes, so cached summaries are not reused
+            "version": hashlib.sha256(version.encode("utf-8")).hexdigest()[:16],
+        }
+    return registry
+
+
+SUMMARIZERS = build_registry(json.loads(os.environ["SUMMARIZERS"]))
+
+
+def get_summarizer(name):
+    """Return a summarizer from the registry
+
+    Args:
+        name (str): The summarizer name set in the notifier
+
+    Raises:
+        KeyError: The summarizer is not defined in cdk.json
+    """
+
+    try:
+        return SUMMARIZERS[name]
+    except KeyError:
+        raise KeyError(f"Summarizer {name} is not defined in the summarizers context") from None
@@ -0,0 +1,89 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Content-addressed cache of article summaries, shared by notifiers and retried invocations"""
+
+import hashlib
+import os
+import time
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+import log
+
+SUMMARY_CACHE_TABLE_NAME = os.environ.get("SUMMARY_CACHE_TABLE_NAME")
+SUMMARY_CACHE_TTL_DAYS = int(os.environ.get("SUMMARY_CACHE_TTL_DAYS", "30"))
+
+table = boto3.resource("dynamodb").Table(SUMMARY_CACHE_TABLE_NAME) if SUMMARY_CACHE_TABLE_NAME else None
+
+
+def cache_key(content, summarizer_name, model_id, prompt_version):
+    """Build the cache key of a summary
+
+    Args:
+        content (str): The extracted article text
+        summarizer_name (str): The name of the summarizer
+        model_id (str): The Bedrock model ID
+        prompt_version (str): The version of the summarizer prompt
+
+    Returns:
+        str: The SHA-256 hex digest identifying the summary
+    """
+
+    digest = hashlib.sha256()
+    for part in (summarizer_name, model_id, prompt_version, content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_summary(key):
+    """Look up a cached summary
+
+    Args:
+        key (str): The cache key
+
+    Returns:
+        tuple: (summary, detail, twitter), or None on a miss or when the cache is disabled
+    """
+
+    if table is None:
+        return None
+    try:
+        response = table.get_item(Key={"cache_key": key})
+    except (BotoCoreError, ClientError) as e:
+        log.warning("Summary cache lookup failed", error=str(e))
+        return None
+
+    item = response.get("Item")
+    # DynamoDB deletes expired items lazily, so check the TTL as well
+    if item is None or int(item["expires_at"]) < time.time():
+        return None
+    return item["summary"], item["detail"], item["twitter"]
+
+
+def put_summary(key, summary, detail, twitter):
+    """Store a summary in the cache
+
+    Args:
+        key (str): The cache key
+        summary (str): The summary
+        detail (str): The bulleted analysis
+        twitter (str): The post for X
+    """
+
+    if table is None:
+        return
+    try:
+        table.put_item(
+            Item={
+                "cache_key": key,
+                "summary": summary,
+                "detail": detail,
+                "twitter": twitter,
+                "expires_at": int(time.time()) + SUMMARY_CACHE_TTL_DAYS * 86400,
+            }
+        )
+    except (BotoCoreError, ClientError) as e:
+        log.warning("Summary cache write failed", error=str(e))
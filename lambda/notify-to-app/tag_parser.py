@@ -0,0 +1,187 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Incremental extraction of the <thinking>, <summary> and <twitter> sections of a model output
+
+The output of a batched summarization holds these sections once per article, each answer
+inside <article id="N"></article> tags.
+"""
+
+import re
+
+import log
+
+SECTIONS = ("thinking", "summary", "twitter")
+# Generation can stop once this section is closed
+LAST_SECTION = "twitter"
+# Length of the longest tag, "</thinking>"
+MAX_TAG_CHARS = max(len(name) for name in SECTIONS) + 3
+TWITTER_MAX_CHARS = 200
+
+# The answer for one article of a batch; an unclosed answer runs to the next one or to the end
+ARTICLE = re.compile(r'<article id="(\d+)">(.*?)(?=</article>|<article id="|\Z)', re.S)
+ARTICLE_CLOSE = "</article>"
+
+
+class TagStreamParser:
+    """Extract tagged sections from text that arrives in pieces
+
+    Text is scanned once: outside a section the parser looks for an opening tag, inside a
+    section it looks for the matching closing tag. A possibly incomplete tag at the end of
+    the received text is kept until the next piece arrives.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.current = None
+        self.done = False
+        self._buffer = ""
+        self._content = []
+        self._outside = []
+
+    def feed(self, text):
+        """Consume the next piece of the output
+
+        Args:
+            text (str): The text received since the last call
+
+        Returns:
+            bool: True once the last section has been closed
+        """
+
+        if self.done:
+            return True
+        self._buffer += text
+        while True:
+            if self.current is None:
+                start, name = self._find_open()
+                if start < 0:
+                    self._keep_tail(self._outside)
+                    return self.done
+                self._outside.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(name) + 2 :]
+                self.current = name
+                self._content = []
+            else:
+                close = f"</{self.current}>"
+                end = self._buffer.find(close)
+                if end < 0:
+                    self._keep_tail(self._content)
+                    return self.done
+                self._content.append(self._buffer[:end])
+                self.sections[self.current] = "".join(self._content)
+                self._buffer = self._buffer[end + len(close) :]
+                if self.current == LAST_SECTION:
+                    self.done = True
+                self.current = None
+                if self.done:
+                    return True
+
+    def _find_open(self):
+        """Find the first opening tag of a section that has not been seen yet"""
+
+        found = (-1, None)
+        for name in SECTIONS:
+            if name in self.sections:
+                continue
+            start = self._buffer.find(f"<{name}>")
+            if start >= 0 and (found[0] < 0 or start < found[0]):
+                found = (start, name)
+        return found
+
+    def _keep_tail(self, target):
+        """Move the buffered text to target, except a trailing partial tag"""
+
+        cut = self._buffer.rfind("<", max(0, len(self._buffer) - MAX_TAG_CHARS))
+        if cut < 0 or ">" in self._buffer[cut:]:
+            cut = len(self._buffer)
+        target.append(self._buffer[:cut])
+        self._buffer = self._buffer[cut:]
+
+    def result(self):
+        """Return the sections, falling back for the ones the model did not produce
+
+        - an unclosed section keeps the text received so far
+        - a missing summary is taken from the text outside any section
+        - a missing twitter post is taken from the summary
+        - a missing analysis is left empty
+
+        Returns:
+            tuple: (summary, detail, twitter)
+
+        Raises:
+            ValueError: No summary could be recovered from the output
+        """
+
+        sections = dict(self.sections)
+        if self.current is not None and self.current not in sections:
+            sections[self.current] = "".join(self._content) + self._buffer
+        outside = ("".join(self._outside) + ("" if self.current else self._buffer)).strip()
+
+        summary = sections.get("summary", "").strip() or outside
+        if not summary:
+            raise ValueError("No summary found in the model output")
+        detail = sections.get("thinking", "").strip()
+        twitter = sections.get("twitter", "").strip() or summary[:TWITTER_MAX_CHARS]
+        missing = [name for name in SECTIONS if name not in self.sections]
+        if missing:
+            log.warning("Sections missing from the model output", missing=missing)
+        return summary, detail, twitter
+
+
+class BatchStreamParser:
+    """Split the output of a batched summarization into the sections of each article
+
+    The articles of the batch are numbered from 1, and the model answers each one inside
+    <article id="N"></article> tags. Generation can stop once the last article is closed.
+
+    Args:
+        count (int): The number of articles in the batch
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.done = False
+        self._last_open = f'<article id="{count}">'
+        self._text = ""
+
+    def feed(self, text):
+        """Consume the next piece of the output
+
+        Args:
+            text (str): The text received since the last call
+
+        Returns:
+            bool: True once the last article has been closed
+        """
+
+        if self.done:
+            return True
+        self._text += text
+        # Only the end of the text can hold a new closing tag
+        tail = self._text[-(len(text) + len(self._last_open) + len(ARTICLE_CLOSE)) :]
+        if ARTICLE_CLOSE in tail:
+            last = self._text.rfind(self._last_open)
+            self.done = last >= 0 and self._text.find(ARTICLE_CLOSE, last) >= 0
+        return self.done
+
+    def results(self):
+        """Return the sections of the articles that could be parsed
+
+        An article is parsed when its <summary> section is complete. The others are left out,
+        to be summarized on their own.
+
+        Returns:
+            dict: Mapping of article number to (summary, detail, twitter)
+        """
+
+        results = {}
+        for match in ARTICLE.finditer(self._text):
+            number = int(match.group(1))
+            if number in results or not 1 <= number <= self.count:
+                continue
+            parser = TagStreamParser()
+            parser.feed(match.group(2))
+            if "summary" in parser.sections and parser.sections["summary"].strip():
+                results[number] = parser.result()
+        return results
@@ -0,0 +1,316 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Adaptive concurrency and circuit breaking for model calls
+
+Each model (ID and Region) gets a guard kept across warm invocations:
+- An AIMD limiter caps the calls in flight. The limit grows by about one per round of
+  successful calls, and is cut when a call is throttled (by THROTTLE_DECREASE) or slower than
+  MODEL_LATENCY_TARGET_SECONDS (by LATENCY_DECREASE), so that the notifier settles near the
+  account quota instead of hitting it repeatedly.
+- A circuit breaker stops calling the model when most recent calls failed. Throttled calls
+  only count as failures once the limiter is at its minimum, as until then lowering the limit
+  is the answer. After BREAKER_COOLDOWN_SECONDS one trial call is let through; it closes the
+  circuit if it succeeds, and opens it again otherwise (throttled or not).
+A cancelled call (e.g., a thread or a generator abandoned on shutdown) says nothing about the
+model: it frees its slot in the limiter but is neither an outcome for the limit nor for the
+breaker.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+import log
+import metrics
+
+MODEL_MAX_CONCURRENCY = int(os.environ.get("MODEL_MAX_CONCURRENCY", "8"))
+MODEL_MIN_CONCURRENCY = 1
+# Calls slower than this are a sign of congestion (a streamed summary usually takes 10-20 s)
+MODEL_LATENCY_TARGET_SECONDS = float(os.environ.get("MODEL_LATENCY_TARGET_SECONDS", "60"))
+THROTTLE_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+
+# The circuit opens when BREAKER_ERROR_RATE of the last BREAKER_WINDOW calls (at least
+# BREAKER_MIN_CALLS) failed
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 5
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("BREAKER_COOLDOWN_SECONDS", "60"))
+
+# Error codes of Bedrock when the quota or the capacity of the model is exceeded
+THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+# Outcomes of a call
+OK = "ok"
+SLOW = "slow"
+THROTTLED = "throttled"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Errors raised into a call that was abandoned rather than answered by the model
+CANCELLATIONS = (GeneratorExit, asyncio.CancelledError, concurrent.futures.CancelledError)
+
+
+class CircuitOpenError(Exception):
+    """The model is not called while its circuit breaker is open
+
+    Args:
+        retry_after (float): Seconds until the breaker lets a trial call through
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Model circuit breaker is open, retry after {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+def is_throttle(error):
+    """Return whether an error means the model is over its quota or capacity
+
+    Args:
+        error (Exception): The error raised by the model call, or by Strands on its behalf
+    """
+
+    while error is not None:
+        # Strands reports Bedrock throttling as its own exception type
+        if type(error).__name__ == "ModelThrottledException":
+            return True
+        if isinstance(error, ClientError):
+            code = error.response["Error"].get("Code", "")
+            # Errors in the middle of ConverseStream use camel case, e.g., "throttlingException"
+            if code[:1].upper() + code[1:] in THROTTLE_CODES:
+                return True
+        error = error.__cause__
+    return False
+
+
+def is_cancellation(error):
+    """Return whether an error means the call was abandoned, not that the model failed
+
+    Args:
+        error (BaseException): The error raised inside the guarded call
+    """
+
+    # Besides cancellations, KeyboardInterrupt and SystemExit are not the model's doing either
+    return isinstance(error, CANCELLATIONS) or not isinstance(error, Exception)
+
+
+class AdaptiveLimiter:
+    """Additive-increase / multiplicative-decrease limit on concurrent calls
+
+    A decrease only applies to calls started after the previous decrease, so that a burst of
+    throttled calls made under the same limit cuts it once.
+
+    Args:
+        max_limit (int): The highest limit, also the initial one
+        min_limit (int): The lowest limit
+    """
+
+    def __init__(self, max_limit, min_limit=MODEL_MIN_CONCURRENCY):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait until a call may start
+
+        Returns:
+            float: The start time of the call, to pass to release
+        """
+
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started, outcome):
+        """Record the end of a call and adapt the limit
+
+        Args:
+            started (float): The value returned by acquire
+            outcome (str): OK, SLOW, THROTTLED, FAILED or CANCELLED (only frees the slot)
+        """
+
+        with self._condition:
+            self.in_flight -= 1
+            if outcome in (THROTTLED, SLOW) and started >= self._decreased_at:
+                factor = THROTTLE_DECREASE if outcome == THROTTLED else LATENCY_DECREASE
+                self.limit = max(self.min_limit, self.limit * factor)
+                self._decreased_at = time.monotonic()
+            elif outcome == OK:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Stop calling a model while most of its recent calls fail
+
+    Args:
+        window (int): The number of recent calls considered
+        min_calls (int): The circuit does not open on fewer calls
+        error_rate (float): The share of failed calls that opens the circuit
+        cooldown (float): Seconds the circuit stays open before a trial call
+    """
+
+    def __init__(
+        self,
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        error_rate=BREAKER_ERROR_RATE,
+        cooldown=BREAKER_COOLDOWN_SECONDS,
+    ):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._outcomes = collections.deque(maxlen=window)
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Return the seconds until a trial call is let through (0 if calls are allowed)"""
+
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        """Return whether a call may be made now
+
+        Once the cooldown has passed, a single trial call is allowed (half-open state).
+        """
+
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self._opened_at + self.cooldown:
+                self.state = "half-open"
+                return True
+            return False
+
+    def record(self, success):
+        """Record the outcome of a call
+
+        Args:
+            success (bool): Whether the call succeeded
+        """
+
+        with self._lock:
+            if self.state == "half-open":
+                if success:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self.state = "open"
+                    self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (
+                self.state == "closed"
+                and len(self._outcomes) >= self.min_calls
+                and failures >= self.error_rate * len(self._outcomes)
+            ):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                log.warning("Model circuit breaker opened", failures=failures, calls=len(self._outcomes))
+
+    def abandon(self):
+        """Record a call that ended without an outcome
+
+        An abandoned trial call lets the next call be the trial instead, as the cooldown has
+        already passed; otherwise the breaker would stay half-open and reject every call.
+        """
+
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+
+
+class ModelGuard:
+    """The limiter and the circuit breaker of one model
+
+    Args:
+        model_id (str): The Bedrock model ID
+        region (str): The Region the model is called in
+    """
+
+    def __init__(self, model_id, region):
+        self.model_id = model_id
+        self.region = region
+        self.limiter = AdaptiveLimiter(MODEL_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker()
+
+    @contextlib.contextmanager
+    def call(self):
+        """Guard one model call made inside the block
+
+        Raises:
+            CircuitOpenError: The circuit is open; the model is not called
+        """
+
+        if not self.breaker.allow():
+            metrics.put_metric("CircuitRejections", 1, Model=self.model_id)
+            raise CircuitOpenError(self.breaker.retry_after())
+        # The trial call after the cooldown always decides the breaker state, or it would stay
+        # half-open and reject every call
+        trial = self.breaker.state == "half-open"
+        started = self.limiter.acquire()
+        try:
+            yield
+        except BaseException as e:
+            if is_cancellation(e):
+                outcome = CANCELLED
+            elif is_throttle(e):
+                outcome = THROTTLED
+            else:
+                outcome = FAILED
+            raise
+        else:
+            elapsed = time.monotonic() - started
+            outcome = SLOW if elapsed > MODEL_LATENCY_TARGET_SECONDS else OK
+        finally:
+            at_minimum = self.limiter.limit <= self.limiter.min_limit
+            self.limiter.release(started, outcome)
+            if outcome == CANCELLED:
+                self.breaker.abandon()
+            elif outcome != THROTTLED or at_minimum or trial:
+                self.breaker.record(outcome in (OK, SLOW))
+            if outcome == THROTTLED:
+                metrics.put_metric("ModelThrottles", 1, Model=self.model_id)
+            metrics.put_metric("ModelConcurrencyLimit", round(self.limiter.limit, 2), Model=self.model_id)
+
+
+_lock = threading.Lock()
+_guards = {}
+
+
+def get_guard(model_id, region):
+    """Return the guard of a model, created once per container
+
+    Args:
+        model_id (str): The Bedrock model ID
+        region (str): The Region the model is called in
+    """
+
+    with _lock:
+        key = (model_id, region)
+        if key not in _guards:
+            _guards[key] = ModelGuard(model_id, region)
+        return _guards[key]
@@ -0,0 +1,77 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Local token estimation and chunking of long articles"""
+
+import re
+
+# CJK characters are roughly one token each; other text is roughly four characters per token
+CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH = re.compile(r"\n\s*\n")
+SENTENCE = re.compile(r"(?<=[.!?。！？])\s*")
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens of a text without calling the model
+
+    The estimate errs on the high side, so that a text within the budget also fits the model.
+
+    Args:
+        text (str): The text
+    """
+
+    cjk = len(CJK.findall(text))
+    return cjk + (len(text) - cjk + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_text(text, max_tokens):
+    """Split a text that is too long into pieces, by sentence and then by characters
+
+    Args:
+        text (str): The text to split
+        max_tokens (int): The maximum estimated tokens of a piece
+    """
+
+    pieces = []
+    for sentence in SENTENCE.split(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        # Every character counts as at most one token
+        for i in range(0, len(sentence), max_tokens):
+            pieces.append(sentence[i : i + max_tokens])
+    return [piece for piece in pieces if piece]
+
+
+def split_into_chunks(text, max_tokens):
+    """Split a text into chunks of at most max_tokens, keeping paragraphs together where possible
+
+    Args:
+        text (str): The text to split
+        max_tokens (int): The maximum estimated tokens of a chunk
+
+    Returns:
+        list: The chunks, in the order of the text
+    """
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for paragraph in PARAGRAPH.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = estimate_tokens(paragraph)
+        pieces = [paragraph] if tokens <= max_tokens else split_text(paragraph, max_tokens)
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
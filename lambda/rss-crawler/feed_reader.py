@@ -0,0 +1,163 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import html
+
+import dateutil.parser
+from lxml import etree
+
+import log
+
+# Size of each read from the HTTP response
+CHUNK_SIZE = 16 * 1024
+
+# RSS 2.0 / RSS 1.0 use <item>, Atom uses <entry>
+ENTRY_TAGS = ("item", "entry")
+
+# Publication date elements in order of preference (RSS pubDate, Atom published/updated, Dublin Core date)
+DATE_TAGS = ("pubDate", "published", "date", "updated")
+
+# Feed-level elements telling how often the feed changes (RSS <ttl>, RSS 1.0 syndication module)
+HINT_TAGS = ("ttl", "updatePeriod", "updateFrequency")
+
+# Raised for a document that is not XML at all; retrying the download does not help
+ParseError = etree.XMLSyntaxError
+
+
+def local_name(tag):
+    """Strip the XML namespace from a tag name
+
+    Args:
+        tag (str): The tag name, e.g., "{http://www.w3.org/2005/Atom}entry"
+    """
+
+    return tag.rsplit("}", 1)[-1]
+
+
+def str2datetime(time_str):
+    """Convert the date format from the blog text to datetime
+
+    Args:
+        time_str (str): The date and time string, e.g., "Tue, 20 Sep 2022 16:05:47 +0000"
+    """
+
+    return dateutil.parser.parse(time_str, ignoretz=True)
+
+
+def element_text(elem):
+    """Return the text of an element, with the HTML entities left unresolved by the parser
+
+    Args:
+        elem (lxml.etree._Element): The element, e.g., <title>
+    """
+
+    parts = [elem.text or ""]
+    for child in elem:
+        if isinstance(child, etree._Entity):
+            parts.append(html.unescape(child.text))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def parse_entry(elem):
+    """Extract the fields used by the crawler from an <item> or <entry> element
+
+    Args:
+        elem (lxml.etree._Element): The entry element
+
+    Returns:
+        dict: The "title", "link" and "published" (datetime) of the entry. "published" is None
+            if the entry has no parsable date.
+    """
+
+    entry = {"title": "", "link": None, "published": None}
+    dates = {}
+    for child in elem:
+        # Comments and processing instructions have no string tag
+        if not isinstance(child.tag, str):
+            continue
+        name = local_name(child.tag)
+        if name == "title":
+            entry["title"] = element_text(child).strip()
+        elif name == "link":
+            # Atom links carry the URL in href; prefer rel="alternate" (the default)
+            href = child.get("href")
+            if href is None:
+                entry["link"] = element_text(child).strip() or entry["link"]
+            elif child.get("rel", "alternate") == "alternate" or entry["link"] is None:
+                entry["link"] = href.strip()
+        elif name in DATE_TAGS and child.text:
+            dates.setdefault(name, element_text(child).strip())
+
+    for name in DATE_TAGS:
+        if name in dates:
+            try:
+                entry["published"] = str2datetime(dates[name])
+            except (ValueError, OverflowError):
+                continue
+            break
+    return entry
+
+
+def iter_entries(stream, hints=None):
+    """Parse an RSS or Atom document incrementally and yield its entries
+
+    Each entry is detached from the tree once parsed, so memory use does not grow with
+    the length of the feed. The caller can stop iterating at any point without reading the
+    rest of the document. The parser recovers from errors such as undefined HTML entities
+    (e.g., &nbsp;), which are common in feeds, instead of rejecting the whole document.
+
+    Args:
+        stream: A file-like object returning bytes, e.g., an HTTP response
+        hints (dict): If given, the feed-level HINT_TAGS read so far are stored in it by name
+    """
+
+    parser = etree.XMLPullParser(events=("start", "end"), recover=True, resolve_entities=False)
+    stack = []
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            name = local_name(elem.tag)
+            if hints is not None and name in HINT_TAGS and elem.text:
+                if not any(local_name(parent.tag) in ENTRY_TAGS for parent in stack):
+                    hints[name] = elem.text.strip()
+            if name in ENTRY_TAGS:
+                entry = parse_entry(elem)
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+                yield entry
+
+
+def read_new_entries(stream, since, hints=None):
+    """Read the entries published after a point in time
+
+    Feeds list entries in reverse-chronological order, so reading stops at the first entry
+    that is not newer than `since`.
+
+    Args:
+        stream: A file-like object returning bytes, e.g., an HTTP response
+        since (datetime.datetime): Entries published at or before this time are not returned
+        hints (dict): If given, the feed-level HINT_TAGS are stored in it (see iter_entries).
+            They precede the entries in RSS, so they are read even when reading stops early.
+
+    Returns:
+        list: The new entries, newest first
+    """
+
+    entries = []
+    for entry in iter_entries(stream, hints):
+        if entry["published"] is None or not entry["link"]:
+            log.warning("Entry without date or link skipped", sample=True, title=entry["title"])
+            continue
+        if entry["published"] <= since:
+            break
+        entries.append(entry)
+    return entries
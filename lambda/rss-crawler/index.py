@@ -1,12 +1,25 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import boto3
-import datetime
-import feedparser
-import json
-import os
-import dateutil.parser
+import startup
+
+with startup.profile_imports():
+    import boto3
+    import concurrent.futures
+    import datetime
+    import json
+    import os
+    import time
+    import urllib.error
+    import urllib.parse
+    import urllib.request
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    import fingerprint
+    import log
+    import metrics
+    import polling
+    from feed_reader import ParseError, read_new_entries
 
 # CRAWL_BLOG_URL = json.loads(os.environ["RSS_URL"])
 # NOTIFIERS = json.loads(os.environ["NOTIFIERS"])
@@ -15,93 +28,788 @@ DDB_TABLE_NAME = os.environ["DDB_TABLE_NAME"]
 dynamo = boto3.resource("dynamodb")
 table = dynamo.Table(DDB_TABLE_NAME)
 
+# Per-feed crawl state: HTTP validators and the newest ingested publication time
+CRAWL_STATE_TABLE_NAME = os.environ["CRAWL_STATE_TABLE_NAME"]
+crawl_state_table = dynamo.Table(CRAWL_STATE_TABLE_NAME)
+
+# Feeds are downloaded in parallel; each one gets its own timeout and retries
+FEED_FETCH_WORKERS = int(os.environ.get("FEED_FETCH_WORKERS", "8"))
+FEED_FETCH_TIMEOUT = float(os.environ.get("FEED_FETCH_TIMEOUT", "10"))
+FEED_FETCH_RETRIES = int(os.environ.get("FEED_FETCH_RETRIES", "2"))
+
+# DynamoDB batch limits and the retry budget for unprocessed keys/items
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+BATCH_MAX_ATTEMPTS = 5
+
+# Entries older than this are never ingested by the scheduled crawl.
+# To retrieve older entries, run a backfill (see backfill()) instead of changing this.
+RECENT_DAYS = int(os.environ.get("RECENT_DAYS", "7"))
+
+# All notifiers, for the consolidated crawl and backfills
+NOTIFIERS = json.loads(os.environ.get("NOTIFIERS", "{}"))
 
-def recently_published(pubdate):
-    """Check if the publication date is recent
+# Backfill: archive pages are requested as <feed URL>?<BACKFILL_PAGE_PARAM>=<page> (WordPress style)
+BACKFILL_PAGE_PARAM = os.environ.get("BACKFILL_PAGE_PARAM", "paged")
+BACKFILL_MAX_PAGES = int(os.environ.get("BACKFILL_MAX_PAGES", "100"))
+# Items ingested per invocation, so that the notifier drains the stream at its own pace
+BACKFILL_MAX_ITEMS = int(os.environ.get("BACKFILL_MAX_ITEMS", "500"))
+# Checkpoint and return when less than this remains of the invocation
+REMAINING_TIME_MARGIN_MS = 10000
+
+# Titles whose SimHash differs in at most this many bits are the same story. Titles are short,
+# so one differing word already moves the SimHash by several bits; 0 matches titles with the
+# same words in the same order (word pairs are hashed too), regardless of case and punctuation.
+TITLE_SIMHASH_DISTANCE = int(os.environ.get("TITLE_SIMHASH_DISTANCE", "0"))
+
+USER_AGENT = "whats-new-summary-notifier/1.0 (+https://github.com/revsystem/whats-new-summary-notifier)"
+
+
+def crawl_since(watermark):
+    """Decide the publication time from which entries are ingested
 
     Args:
-        pubdate (str): The publication date and time
+        watermark (str): The newest publication time already ingested for this feed (ISO 8601), if any
+
+    Returns:
+        datetime.datetime: Entries published at or before this time are skipped
     """
 
-    elapsed_time = datetime.datetime.now() - str2datetime(pubdate)
-    print(elapsed_time)
-    if elapsed_time.days > 7:
-        return False
+    since = datetime.datetime.now() - datetime.timedelta(days=RECENT_DAYS)
+    if watermark:
+        since = max(since, datetime.datetime.fromisoformat(watermark))
+    return since
 
-    return True
 
+def chunks(items, size):
+    """Split a list into chunks
 
-def str2datetime(time_str):
-    """Convert the date format from the blog text to datetime
+    Args:
+        items (list): The list to split
+        size (int): The maximum size of a chunk
+    """
+
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def backoff(attempt):
+    """Sleep before retrying unprocessed DynamoDB keys or items
 
     Args:
-        time_str (str): The date and time string, e.g., "Tue, 20 Sep 2022 16:05:47 +0000"
+        attempt (int): The number of attempts made so far
     """
 
-    return dateutil.parser.parse(time_str, ignoretz=True)
+    time.sleep(min(0.05 * 2**attempt, 2))
 
 
-def write_to_table(link, title, category, pubtime, notifier_name):
-    """Write a blog post to DynamoDB
+def find_existing_keys(keys):
+    """Find the keys that are already stored in DynamoDB
 
     Args:
-        link (str): The URL of the blog post
-        title (str): The title of the blog post
-        category (str): The category of the blog post
-        pubtime (str): The publication date of the blog post
+        keys (list): List of {"url", "notifier_name"} keys
+
+    Returns:
+        set: (url, notifier_name) tuples that already exist
     """
-    try:
-        item = {
-            "url": link,
-            "notifier_name": notifier_name,
-            "title": title,
-            "category": category,
-            "pubtime": pubtime,
+
+    existing = set()
+    for chunk in chunks(keys, BATCH_GET_SIZE):
+        request = {
+            DDB_TABLE_NAME: {
+                "Keys": chunk,
+                "ProjectionExpression": "#url, notifier_name",
+                "ExpressionAttributeNames": {"#url": "url"},
+            }
         }
-        print(item)
-        table.put_item(Item=item)
-    except Exception as e:
-        # Intentional error handling for duplicates to continue
-        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
-            print("Duplicate item put: " + title)
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            response = dynamo.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(DDB_TABLE_NAME, []):
+                existing.add((item["url"], item["notifier_name"]))
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            backoff(attempt)
         else:
-            # Continue for other errors
-            print(e.message)
+            # Treat keys that could not be checked as existing so they are retried next run
+            for key in request[DDB_TABLE_NAME]["Keys"]:
+                existing.add((key["url"], key["notifier_name"]))
+    return existing
+
+
+def write_items(items):
+    """Write new blog posts to DynamoDB in batches
+
+    Posts already stored are skipped, so that a re-crawl neither consumes write capacity
+    nor emits MODIFY stream records.
+
+    Args:
+        items (list): The blog post items to write
+
+    Returns:
+        dict: The number of "inserted", "skipped" and "failed" items
+    """
+
+    result = {"inserted": 0, "skipped": 0, "failed": 0}
+    unique = {}
+    for item in items:
+        unique.setdefault((item["url"], item["notifier_name"]), item)
+    result["skipped"] += len(items) - len(unique)
+
+    try:
+        existing = find_existing_keys(
+            [{"url": url, "notifier_name": name} for url, name in unique]
+        )
+    except (BotoCoreError, ClientError) as e:
+        log.error("Failed to look up existing items", error=str(e))
+        result["failed"] += len(unique)
+        return result
+
+    new_items = [item for key, item in unique.items() if key not in existing]
+    result["skipped"] += len(unique) - len(new_items)
+
+    for chunk in chunks(new_items, BATCH_WRITE_SIZE):
+        request = {DDB_TABLE_NAME: [{"PutRequest": {"Item": item}} for item in chunk]}
+        try:
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                response = dynamo.batch_write_item(RequestItems=request)
+                request = response.get("UnprocessedItems")
+                if not request:
+                    break
+                backoff(attempt)
+        except (BotoCoreError, ClientError) as e:
+            log.error("Failed to write items", error=str(e))
+            result["failed"] += len(chunk)
+            continue
+        unprocessed = len(request[DDB_TABLE_NAME]) if request else 0
+        result["failed"] += unprocessed
+        result["inserted"] += len(chunk) - unprocessed
+
+    if log.enabled("DEBUG"):
+        for item in new_items:
+            log.debug("Item written", item=item)
+    return result
+
+
+def new_seen_stories():
+    """Return an empty record of the stories ingested in a run, for drop_duplicate_stories"""
+
+    # "titles" maps each SimHash band to the title signatures having it
+    return {"stories": set(), "titles": {}}
+
+
+def drop_duplicate_stories(items, seen):
+    """Drop the items whose story was already ingested in this run
+
+    Overlapping feeds list the same post, sometimes as a localized copy or with a slightly
+    different title. An item is a duplicate when its URL without the locale segment, or a
+    near-identical title (by SimHash), was seen before.
+
+    Args:
+        items (list): The items to write, with "url" and "title_simhash"
+        seen (dict): The stories seen so far (see new_seen_stories), updated in place
+
+    Returns:
+        list: The items of new stories
+    """
+
+    kept = []
+    for item in items:
+        story = fingerprint.story_key(item["url"])
+        signature = int(item["title_simhash"], 16)
+        bands = fingerprint.band_keys(signature, TITLE_SIMHASH_DISTANCE + 1)
+        if story in seen["stories"] or any(
+            fingerprint.hamming_distance(signature, other) <= TITLE_SIMHASH_DISTANCE
+            for band in bands
+            for other in seen["titles"].get(band, ())
+        ):
+            log.info("Duplicate story skipped", sample=True, url=item["url"])
+            continue
+        seen["stories"].add(story)
+        for band in bands:
+            seen["titles"].setdefault(band, []).append(signature)
+        kept.append(item)
+    return kept
 
 
-def add_blog(rss_name, entries, notifier_name):
+def add_blog(rss_name, entries, notifier_name, watermark=None, seen=None):
     """Add blog posts
 
+    URLs are stored in canonical form, with the SimHash of the title next to them.
+
     Args:
         rss_name (str): The category of the blog (RSS unit)
-        entries (List): The list of blog posts
+        entries (List): The list of new blog posts, as returned by read_new_entries
+        watermark (str): The newest publication time already ingested for this feed (ISO 8601)
+        seen (dict): The stories ingested earlier in this run, to skip duplicates across feeds
+
+    Returns:
+        tuple: The new watermark (ISO 8601) and the write counts. The watermark only advances
+            when every item was written, so failed items are retried on the next run.
+    """
+
+    items = [
+        {
+            "url": fingerprint.canonical_url(entry["link"]),
+            "notifier_name": notifier_name,
+            "title": entry["title"],
+            "category": rss_name,
+            "pubtime": entry["published"].isoformat(),
+            "title_simhash": f"{fingerprint.title_simhash(entry['title']):016x}",
+        }
+        for entry in entries
+    ]
+    new_items = items if seen is None else drop_duplicate_stories(items, seen)
+
+    with metrics.stage("ddb_write", Feed=rss_name):
+        result = write_items(new_items)
+    result["skipped"] += len(items) - len(new_items)
+    metrics.put_metric("DuplicateStories", len(items) - len(new_items), Feed=rss_name)
+    log.info("Feed written", feed=rss_name, **result)
+    metrics.put_metric("Inserted", result["inserted"], Feed=rss_name)
+    metrics.put_metric("Skipped", result["skipped"], Feed=rss_name)
+    metrics.put_metric("Failed", result["failed"], Feed=rss_name)
+    if result["failed"] == 0:
+        watermark = max([watermark or ""] + [item["pubtime"] for item in items]) or None
+    return watermark, result
+
+
+def get_crawl_states(rss_urls, notifier_name):
+    """Load the crawl state of each feed of a notifier
+
+    Args:
+        rss_urls (dict): Mapping of RSS name to RSS URL
+        notifier_name (str): The name of the notifier
+
+    Returns:
+        dict: Mapping of RSS URL to its stored crawl state (missing for feeds never crawled)
+    """
+
+    keys = [
+        {"feed_url": rss_url, "notifier_name": notifier_name}
+        for rss_url in set(rss_urls.values())
+    ]
+    states = {}
+    for chunk in chunks(keys, BATCH_GET_SIZE):
+        request = {CRAWL_STATE_TABLE_NAME: {"Keys": chunk}}
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            response = dynamo.batch_get_item(RequestItems=request)
+            for state in response["Responses"].get(CRAWL_STATE_TABLE_NAME, []):
+                states[state["feed_url"]] = state
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            backoff(attempt)
+        else:
+            # Such feeds are crawled as if for the first time; write_items skips the entries
+            # already stored
+            log.warning(
+                "Crawl states could not be read",
+                notifier=notifier_name,
+                feeds=[key["feed_url"] for key in request[CRAWL_STATE_TABLE_NAME]["Keys"]],
+            )
+    return states
+
+
+def save_crawl_state(rss_url, notifier_name, etag, last_modified, watermark, schedule=None):
+    """Store the crawl state of a feed
+
+    Args:
+        rss_url (str): The URL of the RSS feed
+        notifier_name (str): The name of the notifier
+        etag (str): The ETag returned by the server, if any
+        last_modified (str): The Last-Modified header returned by the server, if any
+        watermark (str): The newest publication time already ingested (ISO 8601), if any
+        schedule (dict): The adaptive polling fields (see polling.next_poll), if enabled
+    """
+
+    state = {
+        "feed_url": rss_url,
+        "notifier_name": notifier_name,
+        "checked_at": datetime.datetime.now().isoformat(),
+    }
+    if etag:
+        state["etag"] = etag
+    if last_modified:
+        state["last_modified"] = last_modified
+    if watermark:
+        state["watermark"] = watermark
+    if schedule:
+        state.update(schedule)
+    try:
+        crawl_state_table.put_item(Item=state)
+    except (BotoCoreError, ClientError) as e:
+        # The feed is fetched again from the previous state next run; other feeds go on
+        log.error("Failed to save crawl state", url=rss_url, notifier=notifier_name, error=str(e))
+
+
+def fetch_feed(rss_name, rss_url, since, etag=None, last_modified=None):
+    """Download a feed and read its new entries, retrying transient failures with exponential backoff
+
+    The stored validators are sent as a conditional GET, so an unchanged feed costs a 304.
+    The document is parsed while it is downloaded, and the download stops at the first
+    entry that is not newer than `since`.
+
+    Args:
+        rss_name (str): The name of the RSS feed, used as the metric dimension
+        rss_url (str): The URL of the RSS feed
+        since (datetime.datetime): Entries published at or before this time are not read
+        etag (str): The ETag of the last successful fetch, if any
+        last_modified (str): The Last-Modified header of the last successful fetch, if any
+
+    Returns:
+        dict: The new entries as "entries" (None if not modified), plus "etag", "last_modified"
+            and the feed-level polling "hints" (see read_new_entries)
+    """
+
+    headers = {"User-Agent": USER_AGENT}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    request = urllib.request.Request(rss_url, headers=headers)
+    for attempt in range(FEED_FETCH_RETRIES + 1):
+        try:
+            with metrics.stage("fetch", Feed=rss_name):
+                res = urllib.request.urlopen(request, timeout=FEED_FETCH_TIMEOUT)
+            hints = {}
+            with res, metrics.stage("parse", Feed=rss_name):
+                entries = read_new_entries(res, since, hints)
+            metrics.put_metric("NewEntries", len(entries), Feed=rss_name)
+            return {
+                "entries": entries,
+                "etag": res.headers.get("ETag"),
+                "last_modified": res.headers.get("Last-Modified"),
+                "hints": hints,
+            }
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                metrics.put_metric("NotModified", 1, Feed=rss_name)
+                return {"entries": None, "etag": etag, "last_modified": last_modified, "hints": {}}
+            # Client errors such as 404 will not recover by retrying
+            if (e.code < 500 and e.code != 429) or attempt == FEED_FETCH_RETRIES:
+                raise
+            error = e
+        except ParseError:
+            # The same document would be downloaded again
+            raise
+        except Exception as e:
+            if attempt == FEED_FETCH_RETRIES:
+                raise
+            error = e
+        metrics.put_metric("FetchRetries", 1, Feed=rss_name)
+        wait = 2**attempt
+        log.warning("Feed fetch failed, retrying", url=rss_url, error=str(error), wait=wait)
+        time.sleep(wait)
+
+
+def fetch_feeds(rss_urls, states):
+    """Download and read several feeds concurrently
+
+    A failing feed is logged and left out of the result, so it never blocks the others.
+
+    Args:
+        rss_urls (dict): Mapping of RSS name to RSS URL
+        states (dict): Mapping of RSS URL to its stored crawl state
+
+    Returns:
+        dict: Mapping of RSS name to the fetch_feed result, for the feeds that could be fetched
     """
 
-    for entry in entries:
-        if recently_published(entry["published"]):
-            write_to_table(
-                entry["link"],
-                entry["title"],
+    results = {}
+    workers = max(1, min(FEED_FETCH_WORKERS, len(rss_urls)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for rss_name, rss_url in rss_urls.items():
+            state = states.get(rss_url, {})
+            future = executor.submit(
+                fetch_feed,
                 rss_name,
-                str2datetime(entry["published"]).isoformat(),
-                notifier_name,
+                rss_url,
+                crawl_since(state.get("watermark")),
+                state.get("etag"),
+                state.get("last_modified"),
             )
-        else:
-            print("Old blog entry. skip: " + entry["title"])
+            futures[future] = rss_name
+        for future in concurrent.futures.as_completed(futures):
+            rss_name = futures[future]
+            try:
+                results[rss_name] = future.result()
+            except Exception as e:
+                log.error("Failed to fetch feed", feed=rss_name, error=str(e))
+                metrics.put_metric("FetchFailures", 1, Feed=rss_name)
+    return results
+
+
+def shared_fetch_state(subscribers, states):
+    """Merge the crawl states of the notifiers subscribed to a feed into the state of one fetch
+
+    The fetch reads back to the oldest watermark of the subscribers. The validators are only
+    sent when every subscriber stored the same ones; otherwise a 304 for one subscriber could
+    hide entries another one has not ingested yet.
+
+    Args:
+        subscribers (list): The (notifier name, RSS URL) keys of the subscriptions to the feed
+        states (dict): Mapping of (notifier name, RSS URL) to the stored crawl state
+
+    The adaptive polling fields are merged too: the shortest interval and the recent entries
+    of all subscribers. The publisher hints are the same for every subscriber.
+
+    Returns:
+        dict: A crawl state with "watermark", "etag", "last_modified" and the polling fields
+            when they apply
+    """
+
+    subscriber_states = [states.get(key, {}) for key in subscribers]
+    state = {}
+    watermarks = [s.get("watermark") for s in subscriber_states]
+    if all(watermarks):
+        state["watermark"] = min(watermarks)
+    for name in ("etag", "last_modified"):
+        values = {s.get(name) for s in subscriber_states}
+        if len(values) == 1 and None not in values:
+            state[name] = values.pop()
+
+    intervals = [s["poll_interval"] for s in subscriber_states if s.get("poll_interval")]
+    if intervals:
+        state["poll_interval"] = min(intervals)
+    entry_times = {t for s in subscriber_states for t in s.get("entry_times", [])}
+    if entry_times:
+        state["entry_times"] = sorted(entry_times, reverse=True)
+    for name in ("ttl", "update_period"):
+        values = [s[name] for s in subscriber_states if s.get(name)]
+        if values:
+            state[name] = values[0]
+    return state
+
+
+def crawl(notifiers, crawl_name):
+    """Crawl the feeds of several notifiers and ingest their new entries
+
+    Each distinct feed URL is downloaded and parsed once, and its entries are fanned out to
+    every notifier subscribed to it. The crawl state is still kept per notifier and feed.
+    With adaptive polling, a feed is only fetched when it is due for one of its subscribers.
+
+    Args:
+        notifiers (dict): Mapping of notifier name to its configuration
+        crawl_name (str): The name of this crawl, used as the metric dimension
+
+    Returns:
+        dict: The number of "inserted", "skipped" and "failed" items
+    """
+
+    # Feed URL -> [(notifier name, feed URL)], the keys of its subscriptions
+    subscribers = {}
+    for notifier_name, notifier in notifiers.items():
+        for rss_url in notifier["rssUrl"].values():
+            subscribers.setdefault(rss_url, []).append((notifier_name, rss_url))
+
+    states = {}
+    with metrics.stage("crawl_state_read", Notifier=crawl_name):
+        for notifier_name, notifier in notifiers.items():
+            for rss_url, state in get_crawl_states(notifier["rssUrl"], notifier_name).items():
+                states[(notifier_name, rss_url)] = state
+
+    now = datetime.datetime.now()
+    due = {
+        rss_url
+        for rss_url, keys in subscribers.items()
+        if not polling.ADAPTIVE_POLLING or any(polling.is_due(states.get(key, {}), now) for key in keys)
+    }
+    if len(due) < len(subscribers):
+        log.info("Feeds not due skipped", feeds=len(subscribers) - len(due))
+        metrics.put_metric("FeedsNotDue", len(subscribers) - len(due), Notifier=crawl_name)
+
+    # One fetch per feed URL, named after the first subscription to it
+    feeds = {}
+    for notifier_name, notifier in notifiers.items():
+        for rss_name, rss_url in notifier["rssUrl"].items():
+            if rss_url in due and rss_url not in feeds.values():
+                feeds[rss_name if rss_name not in feeds else f"{rss_name} ({rss_url})"] = rss_url
+    fetch_states = {rss_url: shared_fetch_state(keys, states) for rss_url, keys in subscribers.items()}
+    rss_results = fetch_feeds(feeds, fetch_states)
+    fetched_by_url = {feeds[name]: fetched for name, fetched in rss_results.items()}
+    metrics.put_metric("FeedFetches", len(feeds), Notifier=crawl_name)
+    metrics.put_metric("FeedSubscriptions", sum(len(keys) for keys in subscribers.values()), Notifier=crawl_name)
+
+    # Feed URL -> the polling fields to store for each of its subscriptions
+    schedules = {}
+    if polling.ADAPTIVE_POLLING:
+        for rss_name, rss_url in feeds.items():
+            fetched = fetched_by_url.get(rss_url)
+            if fetched is None:
+                continue
+            schedules[rss_url] = polling.next_poll(
+                fetch_states[rss_url], fetched["entries"] or [], fetched["hints"], now
+            )
+            metrics.put_metric("PollInterval", schedules[rss_url]["poll_interval"], "Seconds", Feed=rss_name)
+
+    totals = {"inserted": 0, "skipped": 0, "failed": 0}
+    for notifier_name, notifier in notifiers.items():
+        notifier_totals = {"inserted": 0, "skipped": 0, "failed": 0}
+        seen = new_seen_stories()
+        for rss_name, rss_url in notifier["rssUrl"].items():
+            fetched = fetched_by_url.get(rss_url)
+            if fetched is None:
+                continue
+            state = states.get((notifier_name, rss_url), {})
+            schedule = schedules.get(rss_url)
+            if fetched["entries"] is None:
+                log.info("Feed not modified", feed=rss_name)
+                if schedule:
+                    with metrics.stage("crawl_state_write", Feed=rss_name):
+                        save_crawl_state(
+                            rss_url,
+                            notifier_name,
+                            state.get("etag"),
+                            state.get("last_modified"),
+                            state.get("watermark"),
+                            schedule,
+                        )
+                continue
+            watermark = state.get("watermark")
+            since = crawl_since(watermark)
+            entries = [entry for entry in fetched["entries"] if entry["published"] > since]
+            log.info("Feed fetched", feed=rss_name, notifier=notifier_name, entries=len(entries))
+            etag, last_modified = fetched["etag"], fetched["last_modified"]
+            watermark, result = add_blog(rss_name, entries, notifier_name, watermark, seen)
+            for key in notifier_totals:
+                notifier_totals[key] += result[key]
+            if result["failed"]:
+                # Fetch the feed in full next time so that the failed items are retried
+                etag, last_modified = None, None
+                if schedule:
+                    schedule = {key: value for key, value in schedule.items() if key != "next_due"}
+            with metrics.stage("crawl_state_write", Feed=rss_name):
+                save_crawl_state(rss_url, notifier_name, etag, last_modified, watermark, schedule)
+
+        log.info("Crawl result", notifier=notifier_name, **notifier_totals)
+        for key in totals:
+            totals[key] += notifier_totals[key]
+    return totals
+
+
+def crawl_notifier(notifier_name, notifier):
+    """Crawl the feeds of a notifier and ingest their new entries
+
+    Args:
+        notifier_name (str): The name of the notifier
+        notifier (dict): The notifier configuration
+
+    Returns:
+        dict: The number of "inserted", "skipped" and "failed" items
+    """
+
+    return crawl({notifier_name: notifier}, notifier_name)
+
+
+def archive_page_url(rss_url, page):
+    """Return the URL of a page of a feed archive
+
+    Args:
+        rss_url (str): The URL of the RSS feed
+        page (int): The page number, starting at 1 (the feed itself)
+    """
+
+    if page == 1:
+        return rss_url
+    url = urllib.parse.urlsplit(rss_url)
+    query = urllib.parse.parse_qsl(url.query, keep_blank_values=True)
+    query = [(k, v) for k, v in query if k != BACKFILL_PAGE_PARAM] + [(BACKFILL_PAGE_PARAM, str(page))]
+    return urllib.parse.urlunsplit(url._replace(query=urllib.parse.urlencode(query)))
+
+
+def backfill_checkpoint_key(backfill_id, rss_url):
+    """Return the crawl state key under which the progress of a backfill is stored
+
+    Args:
+        backfill_id (str): The ID of the backfill
+        rss_url (str): The URL of the RSS feed
+    """
+
+    return f"backfill#{backfill_id}#{rss_url}"
+
+
+def backfill_feed(backfill, notifier_name, rss_name, rss_url, checkpoint, budget, seen, context):
+    """Ingest the archive of one feed page by page, from the checkpoint onwards
+
+    Paging ends at the first page without entries in the date range, at a page that repeats
+    the previous one (the feed has no archive pages), or at a 404. The checkpoint is saved
+    after every page, so an interrupted backfill resumes from the next page.
+
+    Args:
+        backfill (dict): "id", "since" and "until" (datetime) of the backfill
+        notifier_name (str): The name of the notifier
+        rss_name (str): The name of the RSS feed
+        rss_url (str): The URL of the RSS feed
+        checkpoint (dict): The stored progress of this feed, if any
+        budget (dict): The number of items this invocation may still ingest, as "items"
+        seen (dict): The stories ingested earlier in this invocation for the notifier
+        context: The Lambda context, used to stop before the invocation times out
+
+    Returns:
+        dict: The progress of the feed, as stored in the crawl state table
+    """
+
+    progress = {
+        "feed_url": backfill_checkpoint_key(backfill["id"], rss_url),
+        "notifier_name": notifier_name,
+        "next_page": int(checkpoint.get("next_page", 1)),
+        "completed": checkpoint.get("completed", False),
+        "inserted": int(checkpoint.get("inserted", 0)),
+        "first_link": checkpoint.get("first_link", ""),
+    }
+    while not progress["completed"]:
+        if context and context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+            break
+        if budget["items"] <= 0:
+            break
+        page = progress["next_page"]
+        if page > BACKFILL_MAX_PAGES:
+            log.warning("Backfill stopped at BACKFILL_MAX_PAGES", feed=rss_name, pages=BACKFILL_MAX_PAGES)
+            progress["completed"] = True
+            break
+
+        try:
+            fetched = fetch_feed(rss_name, archive_page_url(rss_url, page), backfill["since"])
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            fetched = {"entries": []}
+        entries = fetched["entries"] or []
+        first_link = entries[0]["link"] if entries else ""
+        if not entries or (page > 1 and first_link == progress["first_link"]):
+            progress["completed"] = True
+            break
+
+        in_range = [entry for entry in entries if entry["published"] <= backfill["until"]]
+        _, result = add_blog(rss_name, in_range, notifier_name, seen=seen)
+        if result["failed"]:
+            # Retry this page on the next run
+            log.warning("Backfill page has failed items, retry later", feed=rss_name, page=page)
+            break
+        log.info("Backfill page written", feed=rss_name, page=page, **result)
+        budget["items"] -= result["inserted"]
+        progress["inserted"] += result["inserted"]
+        progress["first_link"] = first_link
+        progress["next_page"] = page + 1
+        save_backfill_progress(progress, rss_name)
+
+    if progress["completed"] and not checkpoint.get("completed"):
+        save_backfill_progress(progress, rss_name)
+    return progress
+
+
+def save_backfill_progress(progress, rss_name):
+    """Store the progress of a feed backfill
+
+    Args:
+        progress (dict): The progress, keyed by "feed_url" and "notifier_name"
+        rss_name (str): The name of the RSS feed, used as the metric dimension
+    """
+
+    progress["updated_at"] = datetime.datetime.now().isoformat()
+    with metrics.stage("crawl_state_write", Feed=rss_name):
+        crawl_state_table.put_item(Item=progress)
+
+
+def backfill(event, context):
+    """Ingest the entries of a date range from feed archives, resumably
+
+    The live crawl state (validators and watermarks) is left untouched. Progress is stored per
+    feed in the crawl state table under "backfill#<id>#<feed URL>"; invoke again with the same
+    event to resume an incomplete backfill.
+
+    Args:
+        event (dict): {"mode": "backfill", "from": "2025-01-01", "to": "2025-03-31" (optional),
+            "backfillId": (optional, defaults to the date range), "notifiers": [names] (optional,
+            defaults to all), "feeds": [RSS names] (optional, defaults to all feeds of the notifiers)}
+        context: The Lambda context
+
+    Returns:
+        dict: "status" ("complete" or "incomplete"), the write counts and the progress of each feed
+    """
+
+    since = datetime.datetime.fromisoformat(event["from"])
+    until = datetime.datetime.fromisoformat(event["to"]) if event.get("to") else datetime.datetime.now()
+    if until.time() == datetime.time():
+        # A date includes the whole day
+        until += datetime.timedelta(days=1, microseconds=-1)
+    backfill = {
+        "id": event.get("backfillId") or f"{since.date()}_{until.date()}",
+        # fetch_feed stops at the first entry at or before this time
+        "since": since - datetime.timedelta(microseconds=1),
+        "until": until,
+    }
+    budget = {"items": int(event.get("maxItems", BACKFILL_MAX_ITEMS))}
+    notifier_names = event.get("notifiers") or list(NOTIFIERS)
+    feed_names = set(event.get("feeds") or [])
+
+    feeds = {}
+    for notifier_name in notifier_names:
+        for rss_name, rss_url in NOTIFIERS[notifier_name]["rssUrl"].items():
+            if not feed_names or rss_name in feed_names:
+                feeds[(notifier_name, rss_name)] = rss_url
+    log.info("Backfill started", backfill_id=backfill["id"], feeds=len(feeds), since=since, until=until)
+
+    checkpoints = {}
+    with metrics.stage("crawl_state_read", Notifier="backfill"):
+        for notifier_name in notifier_names:
+            keys = {
+                rss_name: backfill_checkpoint_key(backfill["id"], rss_url)
+                for (name, rss_name), rss_url in feeds.items()
+                if name == notifier_name
+            }
+            if keys:
+                for key, state in get_crawl_states(keys, notifier_name).items():
+                    checkpoints[(notifier_name, key)] = state
+
+    progress = {}
+    seen = {name: new_seen_stories() for name in notifier_names}
+    for (notifier_name, rss_name), rss_url in feeds.items():
+        checkpoint = checkpoints.get((notifier_name, backfill_checkpoint_key(backfill["id"], rss_url)), {})
+        try:
+            progress[f"{notifier_name}/{rss_name}"] = backfill_feed(
+                backfill, notifier_name, rss_name, rss_url, checkpoint, budget, seen[notifier_name], context
+            )
+        except Exception as e:
+            log.error("Backfill failed", feed=rss_name, error=str(e), exc_info=True)
+            metrics.put_metric("FetchFailures", 1, Feed=rss_name)
+            progress[f"{notifier_name}/{rss_name}"] = {**checkpoint, "completed": False}
+
+    completed = all(p.get("completed") for p in progress.values())
+    result = {
+        "status": "complete" if completed else "incomplete",
+        "backfillId": backfill["id"],
+        "inserted": sum(int(p.get("inserted", 0)) for p in progress.values()),
+        "feeds": {
+            name: {"next_page": int(p.get("next_page", 1)), "completed": p.get("completed", False)}
+            for name, p in progress.items()
+        },
+    }
+    log.info("Backfill result", **result)
+    return result
 
 
 def handler(event, context):
 
-    notifier_name, notifier = event.values()
-
-    rss_urls = notifier["rssUrl"]
-    for rss_name, rss_url in rss_urls.items():
-        rss_result = feedparser.parse(rss_url)
-        print(json.dumps(rss_result))
-        print("RSS updated " + rss_result["feed"]["updated"])
-        if not recently_published(rss_result["feed"]["updated"]):
-            # Do not process RSS feeds that have not been updated for a certain period of time.
-            # If you want to retrieve from the past, change this number of days and re-import.
-            print("Skip RSS " + rss_name)
-            continue
-        add_blog(rss_name, rss_result["entries"], notifier_name)
+    log.start(context)
+    try:
+        if event.get("mode") == "consolidated":
+            # One scheduled crawl for every notifier in NOTIFIERS
+            with metrics.stage("crawl", Notifier="all"):
+                return crawl(NOTIFIERS, "all")
+
+        if event.get("mode") == "backfill":
+            with metrics.stage("backfill"):
+                return backfill(event, context)
+
+        notifier_name, notifier = event.values()
+        with metrics.stage("crawl", Notifier=notifier_name):
+            return crawl_notifier(notifier_name, notifier)
+    finally:
+        log.finish()
+        metrics.flush()
+
+
+startup.init_complete()
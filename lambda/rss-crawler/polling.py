@@ -0,0 +1,136 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Adaptive polling: an interval learned for each feed from its update cadence
+
+After each fetch, the interval until the next one is derived from the gaps between the recent
+entries of the feed (kept in the crawl state) and the publisher's hints (<ttl>, and
+sy:updatePeriod / sy:updateFrequency). A feed with new entries is polled POLLS_PER_UPDATE
+times per typical gap; a feed without any is polled BACKOFF times less often each time. The
+scheduled rule then only fetches the feeds that are due, so it can run often without
+refetching quiet feeds.
+"""
+
+import datetime
+import os
+import statistics
+
+ADAPTIVE_POLLING = os.environ.get("ADAPTIVE_POLLING", "false").lower() == "true"
+POLL_MIN_INTERVAL = int(os.environ.get("POLL_MIN_INTERVAL_MINUTES", "5")) * 60
+POLL_MAX_INTERVAL = int(os.environ.get("POLL_MAX_INTERVAL_MINUTES", "360")) * 60
+
+# A feed due this soon after the rule fires is fetched now rather than skipped for a whole period
+POLL_DUE_MARGIN = 60
+# Number of recent entry publication times kept per feed
+HISTORY_SIZE = 20
+POLLS_PER_UPDATE = 2
+BACKOFF = 1.5
+
+# sy:updatePeriod values (RSS 1.0 syndication module), in seconds
+UPDATE_PERIODS = {
+    "hourly": 3600,
+    "daily": 86400,
+    "weekly": 7 * 86400,
+    "monthly": 30 * 86400,
+    "yearly": 365 * 86400,
+}
+
+
+def is_due(state, now):
+    """Return whether a feed should be fetched
+
+    Args:
+        state (dict): The stored crawl state of the feed
+        now (datetime.datetime): The current time
+    """
+
+    next_due = state.get("next_due")
+    if not next_due:
+        return True
+    return datetime.datetime.fromisoformat(next_due) <= now + datetime.timedelta(seconds=POLL_DUE_MARGIN)
+
+
+def publisher_hints(hints):
+    """Read the publisher's polling hints of a feed
+
+    Args:
+        hints (dict): The channel elements collected by read_new_entries, e.g., {"ttl": "60"}
+
+    Returns:
+        dict: "ttl" (the minimum time between fetches) and "update_period" (the expected time
+            between updates), in seconds, for the hints that are present and valid
+    """
+
+    result = {}
+    try:
+        if hints.get("ttl"):
+            result["ttl"] = int(hints["ttl"]) * 60
+    except ValueError:
+        pass
+    period = UPDATE_PERIODS.get((hints.get("updatePeriod") or "").lower())
+    if period:
+        try:
+            frequency = max(1, int(hints.get("updateFrequency") or 1))
+        except ValueError:
+            frequency = 1
+        result["update_period"] = period // frequency
+    return result
+
+
+def typical_gap(entry_times):
+    """Return the median time between consecutive entries, in seconds
+
+    Args:
+        entry_times (list): Publication times (ISO 8601), newest first
+
+    Returns:
+        float: The median gap, or None with fewer than two entries
+    """
+
+    times = [datetime.datetime.fromisoformat(t) for t in entry_times]
+    gaps = [(newer - older).total_seconds() for newer, older in zip(times, times[1:])]
+    gaps = [gap for gap in gaps if gap > 0]
+    return statistics.median(gaps) if gaps else None
+
+
+def next_poll(previous, entries, hints, now):
+    """Decide when a feed is fetched next
+
+    Args:
+        previous (dict): The stored crawl state of the feed
+        entries (list): The new entries of this fetch (empty if none or not modified)
+        hints (dict): The channel elements of this fetch (empty if not modified)
+        now (datetime.datetime): The time of this fetch
+
+    Returns:
+        dict: The polling fields of the crawl state: "poll_interval" (seconds), "next_due",
+            "entry_times", and "ttl" / "update_period" when the publisher gives them
+    """
+
+    schedule = {
+        key: int(previous[key]) for key in ("ttl", "update_period") if previous.get(key)
+    }
+    if hints:
+        schedule = publisher_hints(hints)
+    entry_times = sorted(
+        set(previous.get("entry_times", [])) | {entry["published"].isoformat() for entry in entries},
+        reverse=True,
+    )[:HISTORY_SIZE]
+
+    if entries:
+        expected = typical_gap(entry_times) or schedule.get("update_period") or POLL_MIN_INTERVAL
+        interval = expected / POLLS_PER_UPDATE
+    else:
+        interval = float(previous.get("poll_interval", POLL_MIN_INTERVAL)) * BACKOFF
+        # Quiet or not, the publisher says it updates at least this often
+        interval = min(interval, schedule.get("update_period", interval))
+
+    interval = int(min(max(interval, POLL_MIN_INTERVAL, schedule.get("ttl", 0)), POLL_MAX_INTERVAL))
+    schedule.update(
+        {
+            "poll_interval": interval,
+            "next_due": (now + datetime.timedelta(seconds=interval)).isoformat(timespec="seconds"),
+            "entry_times": entry_times,
+        }
+    )
+    return schedule
@@ -0,0 +1,190 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""URL canonicalization and SimHash signatures for finding the same story in several places
+
+A SimHash maps a text to 64 bits so that similar texts differ in few bits. Two texts are
+near-duplicates when the Hamming distance of their signatures is at most a few bits. For
+lookups, the signature is split into bands: near-duplicates within BANDS - 1 bits share at
+least one band exactly, so the bands can be used as keys (locality-sensitive hashing).
+"""
+
+import hashlib
+import re
+import urllib.parse
+
+SIMHASH_BITS = 64
+BANDS = 4
+
+# Query parameters that only track the referrer or campaign
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "mc_cid", "mc_eid", "ref", "trk", "trkcampaign",
+    "sc_campaign", "sc_channel", "sc_content", "sc_country", "sc_geo", "sc_medium", "sc_outcome", "sc_publisher",
+}
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# A leading path segment such as /jp/, /ko/ or /pt-br/ selects a localized copy of the page
+LOCALE_SEGMENT = re.compile(r"^/(?:[a-z]{2}|[a-z]{2}-[a-z]{2,4})(?=/)")
+
+WORD = re.compile(r"\w+")
+
+
+def canonical_url(url):
+    """Normalize a URL so that copies of the same link compare equal
+
+    The scheme and host are lowercased, the default port and the fragment are dropped, and
+    tracking query parameters (utm_*, trk, ...) are removed. The path is kept as is.
+
+    Args:
+        url (str): The URL
+
+    Returns:
+        str: The canonical URL
+    """
+
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    host = (parts.hostname or "").lower()
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    query = [
+        (key, value)
+        for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urllib.parse.urlunsplit(
+        (parts.scheme.lower(), host, parts.path or "/", urllib.parse.urlencode(query), "")
+    )
+
+
+def story_key(url):
+    """Return a key shared by the localized copies of a page, e.g., /jp/blogs/x/ and /blogs/x/
+
+    Args:
+        url (str): The URL
+
+    Returns:
+        str: The canonical URL without its locale path segment
+    """
+
+    parts = urllib.parse.urlsplit(canonical_url(url))
+    return urllib.parse.urlunsplit(parts._replace(path=LOCALE_SEGMENT.sub("", parts.path)))
+
+
+def words(text):
+    """Split a text into lowercase words
+
+    Args:
+        text (str): The text
+    """
+
+    return WORD.findall(text.lower())
+
+
+def shingles(text, size):
+    """Return the overlapping word n-grams of a text
+
+    Args:
+        text (str): The text
+        size (int): The number of words per shingle
+    """
+
+    tokens = words(text)
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def simhash(features):
+    """Compute the 64-bit SimHash of a list of features (repeated features weigh more)
+
+    A bit of the signature is set when it is set in the hash of more than half of the
+    features. The ones are counted for all 64 positions at once with bit-sliced counters
+    (counters[j] holds bit j of each position's count), in O(log n) integer operations per
+    feature instead of 64.
+
+    Args:
+        features (list): The features, e.g., the words or shingles of a text
+
+    Returns:
+        int: The signature
+    """
+
+    counters = []
+    total = 0
+    for feature in features:
+        carry = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        total += 1
+        for j, counter in enumerate(counters):
+            counters[j] = counter ^ carry
+            carry &= counter
+            if not carry:
+                break
+        if carry:
+            counters.append(carry)
+
+    # Compare every count with total // 2 at once, from the most significant counter bit down
+    threshold = total // 2
+    greater = 0
+    equal = (1 << SIMHASH_BITS) - 1
+    for j in range(max(len(counters), threshold.bit_length()) - 1, -1, -1):
+        counter = counters[j] if j < len(counters) else 0
+        if threshold >> j & 1:
+            equal &= counter
+        else:
+            greater |= equal & counter
+            equal &= ~counter
+    return greater
+
+
+def title_simhash(title):
+    """SimHash of a title, on its words and word pairs
+
+    Args:
+        title (str): The title
+    """
+
+    return simhash(shingles(title, 1) + shingles(title, 2))
+
+
+def content_simhash(text):
+    """SimHash of an article, on its 3-word shingles
+
+    Args:
+        text (str): The article text
+    """
+
+    return simhash(shingles(text, 3))
+
+
+def hamming_distance(a, b):
+    """Return the number of bits that differ between two signatures
+
+    Args:
+        a (int): A signature
+        b (int): Another signature
+    """
+
+    return bin(a ^ b).count("1")
+
+
+def band_keys(signature, bands=BANDS):
+    """Split a signature into its bands, as lookup keys
+
+    Signatures within `bands - 1` bits of each other share at least one key, so use one band
+    more than the largest distance searched for: fewer, wider bands mean fewer candidates.
+
+    Args:
+        signature (int): The signature
+        bands (int): The number of bands
+
+    Returns:
+        list: One "<band>:<hex value>" key per band
+    """
+
+    width = -(-SIMHASH_BITS // bands)
+    mask = (1 << width) - 1
+    return [f"{band}:{signature >> (band * width) & mask:x}" for band in range(bands)]
@@ -0,0 +1,140 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Compact JSON-lines logging with a level threshold, sampling and lazy payloads
+
+Each message is written to stdout as one JSON object, e.g.,
+{"level": "INFO", "message": "Feed fetched", "feed": "What's new", "entries": 3}
+
+- LOG_LEVEL (DEBUG, INFO, WARNING or ERROR; INFO by default) sets the lowest level written.
+- Field values may be callables; they are only called when the message is written, so large
+  payloads cost nothing unless debug logging is on: debug("Stream record", record=lambda: r)
+- Messages logged with sample=True are written for their first LOG_SAMPLE_FIRST occurrences
+  in an invocation, then once every LOG_SAMPLE_EVERY occurrences. finish() reports how many
+  were left out.
+"""
+
+import json
+import os
+import sys
+import threading
+import traceback
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LOG_LEVEL = LEVELS.get(os.environ.get("LOG_LEVEL", "INFO").upper(), LEVELS["INFO"])
+LOG_SAMPLE_FIRST = int(os.environ.get("LOG_SAMPLE_FIRST", "5"))
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))
+
+_lock = threading.Lock()
+# Fields added to every message of the invocation, e.g., the request ID
+_context = {}
+# message -> number of occurrences in the invocation, for sampled messages
+_occurrences = {}
+
+
+def enabled(level):
+    """Return whether messages of a level are written
+
+    Args:
+        level (str): "DEBUG", "INFO", "WARNING" or "ERROR"
+    """
+
+    return LEVELS[level] >= LOG_LEVEL
+
+
+def start(context=None, **fields):
+    """Start logging an invocation: reset the sampling counts and set the context fields
+
+    Args:
+        context: The Lambda context, whose request ID is added to every message
+        fields: Other fields to add to every message
+    """
+
+    with _lock:
+        _occurrences.clear()
+        _context.clear()
+        request_id = getattr(context, "aws_request_id", None)
+        if request_id:
+            _context["request_id"] = request_id
+        _context.update(fields)
+
+
+def finish():
+    """Report the sampled messages that were left out during the invocation"""
+
+    with _lock:
+        suppressed = {
+            message: count - sampled_count(count)
+            for message, count in _occurrences.items()
+            if count > sampled_count(count)
+        }
+        _occurrences.clear()
+    if suppressed:
+        info("Sampled messages left out", suppressed=suppressed)
+
+
+def sampled_count(count):
+    """Return how many of `count` occurrences of a sampled message are written"""
+
+    if count <= LOG_SAMPLE_FIRST:
+        return count
+    return LOG_SAMPLE_FIRST + (count - LOG_SAMPLE_FIRST) // LOG_SAMPLE_EVERY
+
+
+def _write(level, message, sample, exc_info, fields):
+    if not enabled(level):
+        return
+    record = {"level": level, "message": message}
+    if sample:
+        with _lock:
+            count = _occurrences.get(message, 0) + 1
+            _occurrences[message] = count
+        if count > LOG_SAMPLE_FIRST and (count - LOG_SAMPLE_FIRST) % LOG_SAMPLE_EVERY:
+            return
+        if count > LOG_SAMPLE_FIRST:
+            record["occurrence"] = count
+    record.update(_context)
+    for name, value in fields.items():
+        record[name] = value() if callable(value) else value
+    if exc_info:
+        record["exception"] = traceback.format_exc()
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def debug(message, sample=False, **fields):
+    """Log a message at the DEBUG level
+
+    Args:
+        message (str): A constant message; variable parts belong in fields
+        sample (bool): Sample the message when it repeats (see the module docstring)
+        fields: Fields of the message. Callables are called only when the message is written.
+    """
+
+    _write("DEBUG", message, sample, False, fields)
+
+
+def info(message, sample=False, **fields):
+    """Log a message at the INFO level (see debug)"""
+
+    _write("INFO", message, sample, False, fields)
+
+
+def warning(message, sample=False, **fields):
+    """Log a message at the WARNING level (see debug)"""
+
+    _write("WARNING", message, sample, False, fields)
+
+
+def error(message, exc_info=False, **fields):
+    """Log a message at the ERROR level, never sampled
+
+    Args:
+        message (str): A constant message; variable parts belong in fields
+        exc_info (bool): Add the traceback of the exception being handled
+        fields: Fields of the message
+    """
+
+    _write("ERROR", message, False, exc_info, fields)
@@ -0,0 +1,115 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Per-stage latency and cost metrics in CloudWatch Embedded Metric Format (EMF)
+
+Metrics are buffered during an invocation and written by flush() as EMF records. In Lambda the
+records go to stdout, where CloudWatch Logs turns them into metrics. When METRICS_FILE is set
+(e.g., by the benchmark), the same records are appended to that file instead.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "WhatsNewSummaryNotifier")
+SERVICE = os.environ.get("METRICS_SERVICE", os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local"))
+METRICS_FILE = os.environ.get("METRICS_FILE")
+
+# EMF accepts at most 100 values per metric in one record
+MAX_VALUES = 100
+
+_lock = threading.Lock()
+# (dimension items) -> {metric name: {"unit": str, "values": list}}
+_buffer = {}
+
+
+def put_metric(name, value, unit="Count", **dimensions):
+    """Record a metric value
+
+    Args:
+        name (str): The metric name, e.g., "InputTokens"
+        value (float): The value
+        unit (str): The CloudWatch unit, e.g., "Count" or "Milliseconds"
+        dimensions: Dimension names and values, e.g., Summarizer="AwsSolutionsArchitectJapanese"
+    """
+
+    key = tuple(sorted((k, str(v)) for k, v in dimensions.items() if v is not None))
+    with _lock:
+        metric = _buffer.setdefault(key, {}).setdefault(name, {"unit": unit, "values": []})
+        metric["values"].append(value)
+
+
+@contextlib.contextmanager
+def stage(name, **dimensions):
+    """Time a stage of the pipeline as the StageDuration metric
+
+    Args:
+        name (str): The stage name, e.g., "fetch", "summarize"
+        dimensions: Additional dimensions, e.g., Feed, Notifier or Summarizer
+    """
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        put_metric("StageDuration", round(elapsed, 2), "Milliseconds", Stage=name, **dimensions)
+
+
+def build_records():
+    """Turn the buffered metrics into EMF records and clear the buffer
+
+    Returns:
+        list: The EMF records, one per dimension set (split to respect MAX_VALUES)
+    """
+
+    with _lock:
+        buffered = dict(_buffer)
+        _buffer.clear()
+
+    timestamp = int(time.time() * 1000)
+    records = []
+    for key, metrics in buffered.items():
+        dimensions = dict(key, Service=SERVICE)
+        longest = max(len(metric["values"]) for metric in metrics.values())
+        for start in range(0, longest, MAX_VALUES):
+            record = {
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": NAMESPACE,
+                            "Dimensions": [sorted(dimensions)],
+                            "Metrics": [],
+                        }
+                    ],
+                },
+                **dimensions,
+            }
+            for name, metric in metrics.items():
+                values = metric["values"][start : start + MAX_VALUES]
+                if not values:
+                    continue
+                record["_aws"]["CloudWatchMetrics"][0]["Metrics"].append(
+                    {"Name": name, "Unit": metric["unit"]}
+                )
+                record[name] = values
+            records.append(record)
+    return records
+
+
+def flush():
+    """Write the buffered metrics, e.g., at the end of an invocation"""
+
+    records = build_records()
+    if not records:
+        return
+    lines = "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+    if METRICS_FILE:
+        with _lock, open(METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(lines + "\n")
+    else:
+        print(lines, flush=True)
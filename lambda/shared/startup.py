@@ -0,0 +1,74 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Import-time profiling of the Lambda init phase
+
+Import this module first in a handler module and wrap its imports in profile_imports(): the
+time spent in each import statement (including the modules it pulls in) is logged once the
+block ends. Call init_complete() at the end of the handler module to record the whole module
+initialization as the InitDuration metric, which is flushed with the first invocation.
+"""
+
+import builtins
+import contextlib
+import sys
+import time
+
+import log
+import metrics
+
+# Imports faster than this are not listed in the report
+REPORT_THRESHOLD_MS = 1.0
+
+STARTED = time.perf_counter()
+
+# name -> milliseconds, of the imports made in the last profile_imports() block
+imports = {}
+
+
+@contextlib.contextmanager
+def profile_imports():
+    """Measure the imports made inside the block
+
+    Only the outermost import statements are timed; modules they import themselves are
+    included in their time. Modules that are already loaded cost nothing and are left out.
+    """
+
+    original_import = builtins.__import__
+    depth = 0
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        nonlocal depth
+        if depth or level or name in sys.modules:
+            depth += 1
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                depth -= 1
+        depth += 1
+        started = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            depth -= 1
+            imports[name] = imports.get(name, 0) + (time.perf_counter() - started) * 1000
+
+    imports.clear()
+    started = time.perf_counter()
+    builtins.__import__ = timed_import
+    try:
+        yield
+    finally:
+        builtins.__import__ = original_import
+        total = (time.perf_counter() - started) * 1000
+        slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)
+        slowest_imports = {name: round(ms, 2) for name, ms in slowest if ms >= REPORT_THRESHOLD_MS}
+        log.info("Init imports", duration_ms=round(total, 2), imports=slowest_imports)
+
+
+def init_complete():
+    """Record the time since this module was imported as the InitDuration metric"""
+
+    total = (time.perf_counter() - STARTED) * 1000
+    log.info("Init complete", duration_ms=round(total, 2))
+    metrics.put_metric("InitDuration", round(total, 2), "Milliseconds")
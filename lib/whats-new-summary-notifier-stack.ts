@@ -5,9 +5,10 @@ import { Rule, Schedule, RuleTargetInput, CronOptions } from 'aws-cdk-lib/aws-ev
 import { LambdaFunction } from 'aws-cdk-lib/aws-events-targets';
 import { Role, Policy, ServicePrincipal, PolicyStatement, Effect } from 'aws-cdk-lib/aws-iam';
 import { Runtime, StartingPosition } from 'aws-cdk-lib/aws-lambda';
-import { DynamoEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
-import { PythonFunction } from '@aws-cdk/aws-lambda-python-alpha';
+import { DynamoEventSource, SqsDlq } from 'aws-cdk-lib/aws-lambda-event-sources';
+import { PythonFunction, PythonLayerVersion } from '@aws-cdk/aws-lambda-python-alpha';
 import { LogGroup, RetentionDays } from 'aws-cdk-lib/aws-logs';
+import { Queue } from 'aws-cdk-lib/aws-sqs';
 import { StringParameter } from 'aws-cdk-lib/aws-ssm';
 import * as path from 'path';
 
@@ -20,6 +21,16 @@ export class WhatsNewSummaryNotifierStack extends Stack {
 
     const modelRegion = this.node.tryGetContext('modelRegion');
     const modelId = this.node.tryGetContext('modelId');
+    // Optional model called when the model above is throttled (defaults to the same model or Region)
+    const fallbackModelId: string | undefined = this.node.tryGetContext('fallbackModelId');
+    const fallbackModelRegion: string | undefined = this.node.tryGetContext('fallbackModelRegion');
+    const promptCaching: boolean = this.node.tryGetContext('promptCaching') ?? false;
+    const summaryBatchSize: number = this.node.tryGetContext('summaryBatchSize') ?? 1;
+    const consolidatedCrawl: boolean = this.node.tryGetContext('consolidatedCrawl') ?? false;
+    const logLevel: string = this.node.tryGetContext('logLevel') ?? 'INFO';
+    const adaptivePolling: boolean = this.node.tryGetContext('adaptivePolling') ?? false;
+    const pollMinIntervalMinutes: number = this.node.tryGetContext('pollMinIntervalMinutes') ?? 5;
+    const pollMaxIntervalMinutes: number = this.node.tryGetContext('pollMaxIntervalMinutes') ?? 360;
 
     const notifiers: [] = this.node.tryGetContext('notifiers');
     const summarizers: [] = this.node.tryGetContext('summarizers');
@@ -37,7 +48,7 @@ export class WhatsNewSummaryNotifierStack extends Stack {
             resources: [`arn:aws:logs:${region}:${accountId}:log-group:*`],
           }),
           new PolicyStatement({
-            actions: ['bedrock:InvokeModel'],
+            actions: ['bedrock:InvokeModel', 'bedrock:InvokeModelWithResponseStream'],
             effect: Effect.ALLOW,
             resources: ['*'],
           }),
@@ -69,6 +80,54 @@ export class WhatsNewSummaryNotifierStack extends Stack {
       stream: StreamViewType.NEW_IMAGE,
     });
 
+    // DynamoDB to store the crawl state of each feed (HTTP validators and the newest ingested entry)
+    const crawlStateTable = new Table(this, 'WhatsNewCrawlState', {
+      partitionKey: { name: 'feed_url', type: AttributeType.STRING },
+      sortKey: { name: 'notifier_name', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+    });
+
+    // DynamoDB to cache summaries by article content, summarizer, model and prompt version
+    const summaryCacheTable = new Table(this, 'WhatsNewSummaryCache', {
+      partitionKey: { name: 'cache_key', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'expires_at',
+      removalPolicy: RemovalPolicy.DESTROY,
+    });
+    summaryCacheTable.grantReadWriteData(notifyNewEntryRole);
+
+    // DynamoDB to index the content SimHash bands of notified articles, to skip near-duplicates
+    const nearDuplicateTable = new Table(this, 'WhatsNewNearDuplicateIndex', {
+      partitionKey: { name: 'band_key', type: AttributeType.STRING },
+      sortKey: { name: 'url', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'expires_at',
+      removalPolicy: RemovalPolicy.DESTROY,
+    });
+    nearDuplicateTable.grantReadWriteData(notifyNewEntryRole);
+
+    // DynamoDB to keep rendered notifications, so that retried records are not summarized or posted twice
+    const outboxTable = new Table(this, 'WhatsNewNotificationOutbox', {
+      partitionKey: { name: 'outbox_key', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'expires_at',
+      removalPolicy: RemovalPolicy.DESTROY,
+    });
+    outboxTable.grantReadWriteData(notifyNewEntryRole);
+
+    // SQS queue receiving the stream batches that ran out of retry attempts, replayed every hour.
+    // The records stay in the stream for 24 hours, so older batches cannot be replayed.
+    const notifyDeadLetterQueue = new Queue(this, 'NotifyNewEntryDeadLetterQueue', {
+      retentionPeriod: Duration.days(1),
+    });
+    notifyDeadLetterQueue.grantConsumeMessages(notifyNewEntryRole);
+
+    // Modules shared by both Lambda functions (e.g., metrics in CloudWatch Embedded Metric Format)
+    const sharedLayer = new PythonLayerVersion(this, 'SharedLayer', {
+      entry: path.join(__dirname, '../lambda/shared'),
+      compatibleRuntimes: [Runtime.PYTHON_3_12],
+    });
+
     // Lambda Function to post new entries written to DynamoDB to Slack
     const notifyNewEntryLogGroup = new LogGroup(this, 'NotifyNewEntryLogGroup', {
       logGroupName: '/aws/lambda/NotifyNewEntry',
@@ -81,27 +140,62 @@ export class WhatsNewSummaryNotifierStack extends Stack {
       entry: path.join(__dirname, '../lambda/notify-to-app'),
       handler: 'handler',
       index: 'index.py',
-      timeout: Duration.seconds(180),
+      timeout: Duration.seconds(300),
       logGroup: notifyNewEntryLogGroup,
       role: notifyNewEntryRole,
       reservedConcurrentExecutions: 1,
+      layers: [sharedLayer],
       environment: {
         MODEL_ID: modelId,
         MODEL_REGION: modelRegion,
         NOTIFIERS: JSON.stringify(notifiers),
         SUMMARIZERS: JSON.stringify(summarizers),
+        PROMPT_CACHING: String(promptCaching),
+        STREAMING_SUMMARY: 'true',
+        SUMMARY_WORKERS: '4',
+        SUMMARY_BATCH_ITEMS: String(summaryBatchSize),
+        SUMMARY_CACHE_TABLE_NAME: summaryCacheTable.tableName,
+        NEAR_DUPLICATE_TABLE_NAME: nearDuplicateTable.tableName,
+        OUTBOX_TABLE_NAME: outboxTable.tableName,
+        DEAD_LETTER_QUEUE_URL: notifyDeadLetterQueue.queueUrl,
+        METRICS_SERVICE: 'notify-to-app',
+        LOG_LEVEL: logLevel,
+        ...(fallbackModelId ? { FALLBACK_MODEL_ID: fallbackModelId } : {}),
+        ...(fallbackModelRegion ? { FALLBACK_MODEL_REGION: fallbackModelRegion } : {}),
       },
     });
 
     notifyNewEntry.addEventSource(
       new DynamoEventSource(rssHistoryTable, {
         startingPosition: StartingPosition.LATEST,
-        batchSize: 1,
+        // Articles in a batch are summarized in parallel and posted in order.
+        // A failed article is reported as a batch item failure and retried from that record.
+        // Records deferred while the model's circuit breaker is open also use up attempts;
+        // batches that run out of attempts go to the dead-letter queue and are replayed.
+        batchSize: 10,
+        maxBatchingWindow: Duration.seconds(5),
+        reportBatchItemFailures: true,
+        bisectBatchOnError: true,
+        retryAttempts: 10,
+        onFailure: new SqsDlq(notifyDeadLetterQueue),
+      })
+    );
+
+    // Replay the batches of the dead-letter queue every hour
+    const replayRule = new Rule(this, 'ReplayFailedNotifications', {
+      schedule: Schedule.rate(Duration.hours(1)),
+      enabled: true,
+    });
+    replayRule.addTarget(
+      new LambdaFunction(notifyNewEntry, {
+        event: RuleTargetInput.fromObject({ mode: 'replay' }),
+        retryAttempts: 2,
       })
     );
 
-    // Allow writing to DynamoDB
-    rssHistoryTable.grantWriteData(newsCrawlerRole);
+    // Allow writing to DynamoDB (reads are used to skip already ingested entries)
+    rssHistoryTable.grantReadWriteData(newsCrawlerRole);
+    crawlStateTable.grantReadWriteData(newsCrawlerRole);
 
     // Lambda Function to fetch RSS and write to DynamoDB
     const newsCrawlerLogGroup = new LogGroup(this, 'NewsCrawlerLogGroup', {
@@ -118,22 +212,32 @@ export class WhatsNewSummaryNotifierStack extends Stack {
       timeout: Duration.seconds(60),
       logGroup: newsCrawlerLogGroup,
       role: newsCrawlerRole,
+      layers: [sharedLayer],
       environment: {
         DDB_TABLE_NAME: rssHistoryTable.tableName,
+        CRAWL_STATE_TABLE_NAME: crawlStateTable.tableName,
         NOTIFIERS: JSON.stringify(notifiers),
+        METRICS_SERVICE: 'rss-crawler',
+        LOG_LEVEL: logLevel,
+        ADAPTIVE_POLLING: String(adaptivePolling),
+        POLL_MIN_INTERVAL_MINUTES: String(pollMinIntervalMinutes),
+        POLL_MAX_INTERVAL_MINUTES: String(pollMaxIntervalMinutes),
       },
     });
 
+    // Run every hour, 24 hours a day, unless a schedule is given
+    const defaultSchedule: CronOptions = {
+      minute: '0',
+      hour: '*',
+      day: '*',
+      month: '*',
+      year: '*',
+    };
+
     for (const notifierName in notifiers) {
       const notifier = notifiers[notifierName];
       // const cron is a cronOption defined in a notifier. if it is not defined, set default schedule (every hour)
-      const schedule: CronOptions = notifier['schedule'] || {
-        minute: '0',
-        hour: '*',
-        day: '*',
-        month: '*',
-        year: '*',
-      };
+      const schedule: CronOptions = notifier['schedule'] || defaultSchedule;
       const webhookUrlParameterName = notifier['webhookUrlParameterName'];
       const webhookUrlParameterStore = StringParameter.fromSecureStringParameterAttributes(
         this,
@@ -146,6 +250,10 @@ export class WhatsNewSummaryNotifierStack extends Stack {
       // add permission to Lambda Role
       webhookUrlParameterStore.grantRead(notifyNewEntryRole);
 
+      if (consolidatedCrawl) {
+        continue;
+      }
+
       // Scheduled Rule for RSS Crawler
       // Run every hour, 24 hours a day
       // see https://docs.aws.amazon.com/AmazonCloudWatch/latest/events/ScheduledEvents.html#CronExpressions
@@ -161,5 +269,21 @@ export class WhatsNewSummaryNotifierStack extends Stack {
         })
       );
     }
+
+    if (consolidatedCrawl) {
+      // A single rule crawls the feeds of all notifiers, fetching each distinct feed URL once
+      const schedule: CronOptions = this.node.tryGetContext('consolidatedCrawlSchedule') || defaultSchedule;
+      const rule = new Rule(this, 'CheckUpdate-Consolidated', {
+        schedule: Schedule.cron(schedule),
+        enabled: true,
+      });
+
+      rule.addTarget(
+        new LambdaFunction(newsCrawler, {
+          event: RuleTargetInput.fromObject({ mode: 'consolidated' }),
+          retryAttempts: 2,
+        })
+      );
+    }
   }
 }
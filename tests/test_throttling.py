@@ -0,0 +1,78 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import concurrent.futures
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "lambda", "notify-to-app"), os.path.join(ROOT, "lambda", "shared")]
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+import throttling  # noqa: E402
+
+
+def throttled():
+    return ClientError({"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "ConverseStream")
+
+
+class ModelGuardTest(unittest.TestCase):
+    def setUp(self):
+        self.guard = throttling.ModelGuard("model", "us-east-1")
+        self.guard.breaker = throttling.CircuitBreaker(cooldown=0)
+
+    def call(self, error=None):
+        with self.guard.call():
+            if error is not None:
+                raise error
+
+    def open_breaker(self):
+        for _ in range(throttling.BREAKER_MIN_CALLS):
+            with self.assertRaises(ValueError):
+                self.call(ValueError("bad output"))
+        self.assertEqual(self.guard.breaker.state, "open")
+
+    def test_throttled_trial_opens_the_breaker_again(self):
+        self.open_breaker()
+        # The limiter is above its minimum, so a throttle alone would not count as a failure
+        self.assertGreater(self.guard.limiter.limit, self.guard.limiter.min_limit)
+        with self.assertRaises(ClientError):
+            self.call(throttled())
+        self.assertEqual(self.guard.breaker.state, "open")
+
+        # After the cooldown, the next trial is let through and closes the breaker
+        self.call()
+        self.assertEqual(self.guard.breaker.state, "closed")
+
+    def test_successful_trial_closes_the_breaker(self):
+        self.open_breaker()
+        self.call()
+        self.assertEqual(self.guard.breaker.state, "closed")
+
+    def test_open_breaker_rejects_calls(self):
+        self.guard.breaker.cooldown = 60
+        self.open_breaker()
+        with self.assertRaises(throttling.CircuitOpenError):
+            self.call()
+
+    def test_cancelled_calls_are_not_failures(self):
+        for _ in range(throttling.BREAKER_MIN_CALLS):
+            with self.assertRaises(concurrent.futures.CancelledError):
+                self.call(concurrent.futures.CancelledError())
+        self.assertEqual(self.guard.breaker.state, "closed")
+        self.assertEqual(self.guard.limiter.limit, self.guard.limiter.max_limit)
+        self.assertEqual(self.guard.limiter.in_flight, 0)
+
+    def test_cancelled_trial_lets_the_next_call_be_the_trial(self):
+        self.open_breaker()
+        with self.assertRaises(KeyboardInterrupt):
+            self.call(KeyboardInterrupt())
+        self.assertEqual(self.guard.breaker.state, "open")
+        self.call()
+        self.assertEqual(self.guard.breaker.state, "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()